@@ -1,24 +1,27 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from itertools import product
+import tkinter.font as tkfont
+import os
 import threading
 import queue
-import re
 import sys
 import random
-from collections import defaultdict
-
-# -------------------- 基础函数 --------------------
-def load_original_combinations(file_path):
-    """加载原始组合数据"""
-    with open(file_path, 'r', encoding='utf-8') as file:
-        return set(line.strip() for line in file)
-
-def save_results(file_path, results):
-    """保存结果到文件"""
-    with open(file_path, 'w', encoding='utf-8') as file:
-        for combo in results:
-            file.write(combo + '\n')
+from concurrent.futures import ThreadPoolExecutor
+
+from filter_engine import (
+    ANY_DIGIT, CONDITION_CHARS, FEATURE_NAMES, STAGE_CACHE, Cancelled, ComboStore,
+    COVER_TIME_BUDGET, DEFAULT_MIN_HITS, DEFAULT_ODDS_TOP_N, FeatureIndex, ProgressState,
+    StageHistory, backtest, combo_statistics, cover_reduce, evaluate_hits, format_backtest,
+    format_bad_lines, format_condition, format_cover_report, format_hit_report,
+    generate_new_combinations, load_combinations, load_draws,
+    load_snapshot, lookup_features, normalize_stage, parse_condition, run_stage,
+    save_results, save_snapshot, stage_key, symbol_mask,
+)
+
+# 进度刷新间隔（毫秒），即界面轮询进度快照的固定帧率
+PROGRESS_INTERVAL = 100
+STAGE_TITLES = {'source': "数据源", 'generate': "生成", 'mystic': "玄学", 'basic': "常规", 'position': "定位",
+                'evaluate': "评估", 'cover': "缩水", 'odds': "赔率"}
 
 # -------------------- 自定义控件 --------------------
 class StyledCheckbutton(tk.Checkbutton):
@@ -33,6 +36,224 @@ class StyledCheckbutton(tk.Checkbutton):
         """动态更新样式"""
         self.style_callback(self["text"], self.variable.get())
 
+class ResultView(ttk.Frame):
+    """虚拟滚动结果列表：只解码并渲染可见的几行
+
+    滚动、翻页与跳转都只改变首行下标，显示开销与数据量无关。
+    """
+    def __init__(self, master, height=20, width=60):
+        super().__init__(master)
+        self.store = ComboStore()
+        # 与各行对应的附注（如命中数），随行一同显示
+        self.notes = None
+        self.note_format = "{}"
+        self.top = 0
+        self.rows = height
+        
+        self.text = tk.Text(self, height=height, width=width, font=('Consolas', 9),
+                            wrap=tk.NONE, state="disabled")
+        self.vsb = ttk.Scrollbar(self, orient="vertical", command=self.on_scroll)
+        hsb = ttk.Scrollbar(self, orient="horizontal", command=self.text.xview)
+        self.text.configure(xscrollcommand=hsb.set)
+        
+        self.text.grid(row=0, column=0, sticky="nsew")
+        self.vsb.grid(row=0, column=1, sticky="ns")
+        hsb.grid(row=1, column=0, sticky="ew")
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+        
+        # 翻页与跳转栏，调用方可往里追加自己的按钮
+        self.bar = ttk.Frame(self)
+        self.bar.grid(row=2, column=0, columnspan=2, pady=5)
+        self.prev_btn = ttk.Button(self.bar, text="◀", width=3, command=lambda: self.scroll_pages(-1))
+        self.page_label = ttk.Label(self.bar, text="0/0")
+        self.next_btn = ttk.Button(self.bar, text="▶", width=3, command=lambda: self.scroll_pages(1))
+        self.jump_entry = ttk.Entry(self.bar, width=8)
+        self.count_label = ttk.Label(self.bar, text="共0条")
+        
+        self.prev_btn.pack(side=tk.LEFT)
+        self.page_label.pack(side=tk.LEFT, padx=5)
+        self.next_btn.pack(side=tk.LEFT)
+        self.jump_entry.pack(side=tk.LEFT, padx=(10, 2))
+        ttk.Button(self.bar, text="跳页", width=4, command=self.jump_page).pack(side=tk.LEFT)
+        ttk.Button(self.bar, text="定位行", width=6, command=self.jump_row).pack(side=tk.LEFT, padx=2)
+        self.count_label.pack(side=tk.LEFT, padx=10)
+        
+        self.jump_entry.bind("<Return>", lambda e: self.jump_page())
+        self.text.bind("<Configure>", self.on_resize)
+        self.text.bind("<MouseWheel>", lambda e: self.scroll_rows(-3 if e.delta > 0 else 3))
+        self.text.bind("<Button-4>", lambda e: self.scroll_rows(-3))
+        self.text.bind("<Button-5>", lambda e: self.scroll_rows(3))
+        self.text.bind("<Prior>", lambda e: self.scroll_pages(-1))
+        self.text.bind("<Next>", lambda e: self.scroll_pages(1))
+        self.refresh()
+
+    def set_data(self, store, notes=None, note_format="{}"):
+        self.store = store
+        self.notes = notes
+        self.note_format = note_format
+        self.top = 0
+        self.refresh()
+
+    @property
+    def total_pages(self):
+        return max(1, (len(self.store) + self.rows - 1) // self.rows)
+
+    def goto_row(self, row):
+        """把第row行（从0开始）滚到首行"""
+        self.top = max(0, min(row, len(self.store) - self.rows))
+        self.refresh()
+
+    def goto_page(self, page):
+        page = max(1, min(page, self.total_pages))
+        self.top = max(0, min((page - 1)*self.rows, len(self.store) - 1))
+        self.refresh()
+
+    def scroll_rows(self, count):
+        self.goto_row(self.top + count)
+        return "break"
+
+    def scroll_pages(self, count):
+        self.goto_page(self.top // self.rows + 1 + count)
+        return "break"
+
+    def on_scroll(self, action, amount, what=None):
+        if action == "moveto":
+            self.goto_row(int(float(amount) * len(self.store)))
+        elif what == "pages":
+            self.scroll_pages(int(amount))
+        else:
+            self.scroll_rows(int(amount))
+
+    def read_jump(self):
+        try:
+            return int(self.jump_entry.get())
+        except ValueError:
+            messagebox.showerror("错误", "请输入有效数字", parent=self)
+            return None
+
+    def jump_page(self):
+        page = self.read_jump()
+        if page is not None:
+            self.goto_page(page)
+
+    def jump_row(self):
+        row = self.read_jump()
+        if row is not None:
+            self.goto_row(row - 1)
+
+    def on_resize(self, event):
+        rows = max(1, event.height // tkfont.Font(font=self.text['font']).metrics('linespace'))
+        if rows != self.rows:
+            self.rows = rows
+            self.refresh()
+
+    def refresh(self):
+        total = len(self.store)
+        lines = self.store.to_strings(self.top, self.top + self.rows)
+        width = len(str(total))
+        lines = [f"{row:>{width}}  {combo}" for row, combo in enumerate(lines, self.top + 1)]
+        if self.notes is not None:
+            notes = self.notes[self.top:self.top + self.rows]
+            lines = [f"{line}  {self.note_format.format(note)}" for line, note in zip(lines, notes)]
+        self.text.config(state="normal")
+        self.text.delete(1.0, tk.END)
+        self.text.insert(tk.END, "\n".join(lines))
+        self.text.config(state="disabled")
+        
+        if total:
+            self.vsb.set(self.top / total, min(1.0, (self.top + self.rows) / total))
+        else:
+            self.vsb.set(0.0, 1.0)
+        page = self.top // self.rows + 1 if total else 0
+        self.page_label["text"] = f"{page}/{self.total_pages if total else 0}"
+        self.prev_btn["state"] = "normal" if self.top > 0 else "disabled"
+        self.next_btn["state"] = "normal" if self.top + self.rows < total else "disabled"
+        self.count_label.config(text=f"共{total}条")
+
+# 过滤阶段共用的后台执行器，同一时刻只跑一个阶段
+STAGE_EXECUTOR = ThreadPoolExecutor(max_workers=1)
+
+class StageRunner:
+    """把过滤阶段提交到后台执行器，自带进度条与取消按钮
+
+    重新提交时先取消上一次运行，被取代的结果直接丢弃。
+    """
+    def __init__(self, master):
+        self.master = master
+        self.frame = ttk.Frame(master)
+        self.progress = ttk.Progressbar(self.frame, orient="horizontal", length=300, mode="determinate")
+        self.label = ttk.Label(self.frame, text="")
+        self.cancel_btn = ttk.Button(self.frame, text="取消", state="disabled", command=self.cancel)
+        self.progress.pack(side=tk.LEFT, padx=5)
+        self.cancel_btn.pack(side=tk.LEFT, padx=5)
+        self.label.pack(side=tk.LEFT, padx=5)
+        self.token = 0
+        self.stop_event = threading.Event()
+        self.state = ProgressState()
+        self.future = None
+        self.after_id = None
+
+    @property
+    def busy(self):
+        return self.future is not None
+
+    def submit(self, func, on_done, text="处理中"):
+        """后台执行func(stop_event, progress)，完成后在界面线程调用on_done(结果)"""
+        self.cancel()
+        self.token += 1
+        self.stop_event = threading.Event()
+        self.state = ProgressState()
+        self.text = text
+        stop_event, state = self.stop_event, self.state
+        self.future = STAGE_EXECUTOR.submit(func, stop_event, state)
+        self.cancel_btn.config(state="normal")
+        self.progress['value'] = 0
+        self.label.config(text=f"{text}…")
+        self.after_id = self.master.after(PROGRESS_INTERVAL, self.poll, self.token, on_done)
+
+    def poll(self, token, on_done):
+        if token != self.token:
+            return
+        if not self.frame.winfo_exists():
+            # 窗口已被直接关闭，通知后台退出
+            self.stop_event.set()
+            return
+        if not self.future.done():
+            fraction, done, found, rate, eta, peak = self.state.snapshot()
+            self.progress['value'] = fraction*100
+            text = f"{self.text} {done}条 | {rate:,.0f} 条/秒"
+            if eta is not None:
+                text += f" | 剩余 {eta:.1f} 秒"
+            self.label.config(text=text)
+            self.after_id = self.master.after(PROGRESS_INTERVAL, self.poll, token, on_done)
+            return
+        future = self.future
+        self.reset()
+        try:
+            result = future.result()
+        except Cancelled:
+            return
+        except Exception as e:
+            messagebox.showerror("错误", str(e), parent=self.master)
+            return
+        on_done(result)
+
+    def cancel(self):
+        """取消当前运行；后台线程在下一个块边界退出，其结果被丢弃"""
+        self.stop_event.set()
+        self.token += 1
+        self.reset()
+
+    def reset(self):
+        if self.after_id is not None:
+            self.master.after_cancel(self.after_id)
+            self.after_id = None
+        self.future = None
+        self.progress['value'] = 0
+        self.label.config(text="")
+        self.cancel_btn.config(state="disabled")
+
 # -------------------- 常规过滤窗口 --------------------
 class BasicFilterWindow(tk.Toplevel):
     def __init__(self, master, app):
@@ -46,13 +267,15 @@ class BasicFilterWindow(tk.Toplevel):
         self.focus_set()
         self.protocol("WM_DELETE_WINDOW", self.on_close)
         
-        self.filtered_data = list(app.new_combinations)
-        self.current_page = 1
-        self.page_size = 20
-        self.total_pages = 0
+        self.filtered_data = app.new_combinations
+        # 输入与当前结果在阶段历史中的节点
+        self.node = self.result_node = app.history.cursor
+        self.feature_index = None
         
         self.create_widgets()
-        self.update_count()
+        self.result_view.set_data(self.filtered_data)
+        self.update_preview()
+        self.build_index()
 
     def create_widgets(self):
         condition_frame = ttk.LabelFrame(self, text="常规过滤条件")
@@ -72,7 +295,7 @@ class BasicFilterWindow(tk.Toplevel):
             row_frame.pack(fill=tk.X, pady=3, padx=5)
             
             var = tk.IntVar(value=1 if idx < 3 else 0)
-            ttk.Checkbutton(row_frame, variable=var).pack(side=tk.LEFT, padx=5)
+            ttk.Checkbutton(row_frame, variable=var, command=self.update_preview).pack(side=tk.LEFT, padx=5)
             self.condition_vars.append(var)
             
             ttk.Label(row_frame, text=label, width=12).pack(side=tk.LEFT)
@@ -84,6 +307,7 @@ class BasicFilterWindow(tk.Toplevel):
                 state="readonly"
             )
             min_combo.set(str(d_min))
+            min_combo.bind("<<ComboboxSelected>>", lambda e: self.update_preview())
             min_combo.pack(side=tk.LEFT)
             self.min_combos.append(min_combo)
             
@@ -96,9 +320,13 @@ class BasicFilterWindow(tk.Toplevel):
                 state="readonly"
             )
             max_combo.set(str(d_max))
+            max_combo.bind("<<ComboboxSelected>>", lambda e: self.update_preview())
             max_combo.pack(side=tk.LEFT)
             self.max_combos.append(max_combo)
 
+        self.preview_label = ttk.Label(condition_frame, text="预计剩余：0条")
+        self.preview_label.pack(anchor="w", padx=10, pady=5)
+
         btn_frame = ttk.Frame(self)
         btn_frame.pack(pady=10)
         ttk.Button(btn_frame, text="开始过滤", command=self.start_filter).pack(side=tk.LEFT, padx=5)
@@ -106,138 +334,96 @@ class BasicFilterWindow(tk.Toplevel):
         ttk.Button(btn_frame, text="上一步", command=self.back_to_mystic).pack(side=tk.LEFT, padx=5)  # 新增按钮
         ttk.Button(btn_frame, text="返回", command=self.on_close).pack(side=tk.LEFT, padx=5)
 
+        self.runner = StageRunner(self)
+        self.runner.frame.pack(pady=5)
+
         result_frame = ttk.LabelFrame(self, text="过滤结果")
         result_frame.pack(pady=10, fill=tk.BOTH, expand=True, padx=10)
         
-        self.result_text = tk.Text(result_frame, height=12, width=70, 
-                                 font=('Consolas', 9), wrap=tk.NONE)
-        vsb = ttk.Scrollbar(result_frame, orient="vertical", command=self.result_text.yview)
-        hsb = ttk.Scrollbar(result_frame, orient="horizontal", command=self.result_text.xview)
-        self.result_text.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
-        
-        self.result_text.grid(row=0, column=0, sticky="nsew")
-        vsb.grid(row=0, column=1, sticky="ns")
-        hsb.grid(row=1, column=0, sticky="ew")
-        result_frame.grid_rowconfigure(0, weight=1)
-        result_frame.grid_columnconfigure(0, weight=1)
-        
-        page_frame = ttk.Frame(self)
-        page_frame.pack(pady=5)
-        self.prev_btn = ttk.Button(page_frame, text="◀", width=3, command=self.prev_page)
-        self.page_label = ttk.Label(page_frame, text="0/0")
-        self.next_btn = ttk.Button(page_frame, text="▶", width=3, command=self.next_page)
-        self.count_label = ttk.Label(page_frame, text="共0条")
-        
-        self.prev_btn.pack(side=tk.LEFT)
-        self.page_label.pack(side=tk.LEFT, padx=5)
-        self.next_btn.pack(side=tk.LEFT)
-        self.count_label.pack(side=tk.LEFT, padx=10)
-        ttk.Button(page_frame, text="保存结果", command=self.save_results).pack(side=tk.LEFT, padx=10)
+        self.result_view = ResultView(result_frame, height=12, width=70)
+        self.result_view.pack(fill=tk.BOTH, expand=True)
+        ttk.Button(self.result_view.bar, text="保存结果", command=self.save_results).pack(side=tk.LEFT, padx=10)
 
-    def start_filter(self):
+    def read_conditions(self):
         active_conditions = []
         for i in range(9):
             if self.condition_vars[i].get():
                 try:
                     min_val = int(self.min_combos[i].get())
                     max_val = int(self.max_combos[i].get())
-                    if min_val > max_val:
-                        messagebox.showerror("错误", "最小值不能大于最大值")
-                        return
-                    active_conditions.append( (i, min_val, max_val) )
                 except ValueError:
-                    messagebox.showerror("错误", "请输入有效数字")
-                    return
+                    raise ValueError("请输入有效数字")
+                if min_val > max_val:
+                    raise ValueError("最小值不能大于最大值")
+                active_conditions.append( (i, min_val, max_val) )
+        return active_conditions
+
+    def build_index(self):
+        """后台读取特征行并建立直方图索引"""
+        data = self.app.new_combinations
+        self.runner.submit(
+            lambda stop, progress: STAGE_CACHE.run(
+                (data.digest(), 'features'), lambda: FeatureIndex(lookup_features(data, stop, progress))),
+            self.index_ready, "建立特征索引")
+
+    def index_ready(self, feature_index):
+        self.feature_index = feature_index
+        self.update_preview()
+
+    def update_preview(self):
+        if self.feature_index is None:
+            self.preview_label.config(text="预计剩余：正在建立索引…")
+            return
+        try:
+            active_conditions = self.read_conditions()
+        except ValueError as e:
+            self.preview_label.config(text=f"预计剩余：{str(e)}")
+            return
+        self.preview_label.config(text=f"预计剩余：{self.feature_index.count(active_conditions)}条")
+
+    def start_filter(self):
+        try:
+            active_conditions = self.read_conditions()
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
         
         if not active_conditions:
             messagebox.showwarning("提示", "请至少选择一个条件")
             return
         
-        filtered = []
-        for combo in self.app.new_combinations:
-            win_count = combo.count('3')
-            draw_count = combo.count('1')
-            lose_count = combo.count('0')
-            
-            win_streak = max(len(m) for m in re.findall(r'3+', combo)) if '3' in combo else 0
-            draw_streak = max(len(m) for m in re.findall(r'1+', combo)) if '1' in combo else 0
-            lose_streak = max(len(m) for m in re.findall(r'0+', combo)) if '0' in combo else 0
-            
-            win_draw = self.calc_mixed_streak(combo, {'3','1'})
-            win_lose = self.calc_mixed_streak(combo, {'3','0'})
-            draw_lose = self.calc_mixed_streak(combo, {'1','0'})
-            
-            valid = True
-            for cond_id, min_v, max_v in active_conditions:
-                value = [
-                    win_count, draw_count, lose_count,
-                    win_streak, draw_streak, lose_streak,
-                    win_draw, win_lose, draw_lose
-                ][cond_id]
-                if not (min_v <= value <= max_v):
-                    valid = False
-                    break
-            if valid:
-                filtered.append(combo)
+        if self.feature_index is None:
+            if not self.runner.busy:
+                self.build_index()
+            messagebox.showinfo("提示", "正在建立特征索引，请稍候")
+            return
         
+        data, feature_index = self.app.new_combinations, self.feature_index
+        params = {'stage': 'basic',
+                  'conditions': [[FEATURE_NAMES[i], min_v, max_v] for i, min_v, max_v in active_conditions]}
+        key = stage_key(data, normalize_stage(params))
+        self.runner.submit(
+            lambda stop, progress: STAGE_CACHE.run(key, lambda: data.select(feature_index.mask(active_conditions))),
+            lambda filtered: self.filter_done(filtered, params), "常规过滤")
+
+    def filter_done(self, filtered, params):
         self.filtered_data = filtered
-        self.current_page = 1
-        self.total_pages = max(1, (len(filtered) + self.page_size -1) // self.page_size)
-        self.update_page_controls()
-        self.show_current_page()
-        self.update_count()
+        self.result_node = self.app.history.push(params, filtered, self.node)
+        self.result_view.set_data(filtered)
         messagebox.showinfo("完成", f"过滤后剩余{len(filtered)}条")
 
-    def calc_mixed_streak(self, combo, chars):
-        max_len = current = 0
-        for c in combo:
-            if c in chars:
-                current += 1
-                max_len = max(max_len, current)
-            else:
-                current = 0
-        return max_len
-
-    def update_page_controls(self):
-        self.prev_btn["state"] = "normal" if self.current_page > 1 else "disabled"
-        self.next_btn["state"] = "normal" if self.current_page < self.total_pages else "disabled"
-        self.page_label["text"] = f"{self.current_page}/{self.total_pages}"
-
-    def show_current_page(self):
-        start = (self.current_page-1)*self.page_size
-        end = start + self.page_size
-        self.result_text.delete(1.0, tk.END)
-        self.result_text.insert(tk.END, "\n".join(self.filtered_data[start:end]))
-
-    def prev_page(self):
-        if self.current_page > 1:
-            self.current_page -= 1
-            self.update_page_controls()
-            self.show_current_page()
-
-    def next_page(self):
-        if self.current_page < self.total_pages:
-            self.current_page += 1
-            self.update_page_controls()
-            self.show_current_page()
-
-    def update_count(self):
-        self.count_label.config(text=f"共{len(self.filtered_data)}条")
-
     def save_results(self):
-        path = filedialog.asksaveasfilename(
-            defaultextension=".txt",
-            filetypes=[("文本文件", "*.txt")]
-        )
-        if path:
-            save_results(path, self.filtered_data)
-            messagebox.showinfo("成功", f"已保存{len(self.filtered_data)}条结果")
+        self.app.save_store(self.filtered_data, self)
 
     def open_position_filter(self):
+        self.runner.cancel()
+        self.app.history.goto(self.result_node)
         PositionFilterWindow(self.master, self.app, self.filtered_data)
         self.destroy()
     
     def back_to_mystic(self):
+        self.runner.cancel()
+        self.app.history.goto(self.node)
         self.app.deiconify()
         MysticFilterWindow(
             self.master, 
@@ -248,6 +434,7 @@ class BasicFilterWindow(tk.Toplevel):
         self.destroy()
     
     def on_close(self):
+        self.runner.cancel()
         self.app.deiconify()
         self.destroy()
 
@@ -256,8 +443,9 @@ class PositionFilterWindow(tk.Toplevel):
     def __init__(self, master, app, data):
         super().__init__(master)
         self.app = app
-        self.original_data = data.copy()
-        self.filtered_data = data.copy()
+        self.original_data = data
+        self.filtered_data = data
+        self.node = self.result_node = app.history.cursor
         self.title("定位过滤")
         self.geometry("900x800")
         
@@ -266,6 +454,8 @@ class PositionFilterWindow(tk.Toplevel):
         self.protocol("WM_DELETE_WINDOW", self.on_close)
         
         self.position_vars = []
+        self.conditions = []
+        self.condition_keys = set()
         self.create_widgets()
         self.show_results()
         
@@ -321,11 +511,8 @@ class PositionFilterWindow(tk.Toplevel):
         self.result_info = ttk.Label(bottom_frame, text="匹配结果：0条")
         self.result_info.pack(pady=5)
 
-        self.result_text = tk.Text(bottom_frame, height=15, width=50, font=('Consolas', 9))
-        scroll_result = ttk.Scrollbar(bottom_frame, command=self.result_text.yview)
-        self.result_text.configure(yscrollcommand=scroll_result.set)
-        self.result_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scroll_result.pack(side=tk.RIGHT, fill=tk.Y)
+        self.result_view = ResultView(bottom_frame, height=15, width=50)
+        self.result_view.pack(fill=tk.BOTH, expand=True)
 
         # 控制区域
         control_frame = ttk.Frame(self)
@@ -334,6 +521,12 @@ class PositionFilterWindow(tk.Toplevel):
         self.filter_type = tk.IntVar(value=1)
         ttk.Radiobutton(control_frame, text="保留匹配项", variable=self.filter_type, value=1).pack(side=tk.LEFT, padx=5)
         ttk.Radiobutton(control_frame, text="过滤匹配项", variable=self.filter_type, value=0).pack(side=tk.LEFT, padx=5)
+        # 容错：至多有几位与条件不符仍算匹配
+        ttk.Label(control_frame, text="容错：").pack(side=tk.LEFT, padx=(10, 0))
+        self.mismatches = ttk.Combobox(control_frame, values=["0", "1", "2", "3"], width=3, state="readonly")
+        self.mismatches.set("0")
+        self.mismatches.pack(side=tk.LEFT)
+        ttk.Label(control_frame, text="位").pack(side=tk.LEFT)
 
         action_frame = ttk.Frame(control_frame)
         action_frame.pack(side=tk.RIGHT, padx=10)
@@ -342,33 +535,31 @@ class PositionFilterWindow(tk.Toplevel):
         ttk.Button(action_frame, text="重置数据", command=self.reset_data).pack(side=tk.LEFT, padx=2)
         ttk.Button(action_frame, text="返回上一步", command=self.back_to_basic).pack(side=tk.LEFT, padx=2)
 
+        self.runner = StageRunner(self)
+        self.runner.frame.pack(pady=5)
+
     def add_condition(self):
-        position_options = []
+        masks = []
         for pos_vars in self.position_vars:
-            selected = []
-            for i, var in enumerate(pos_vars):
-                if var.get():
-                    selected.append(['3', '1', '0'][i])
-            if not selected:
-                selected.append('#')
-            position_options.append(selected)
-        
-        conditions = []
-        for combo in product(*position_options):
-            condition = ''.join(combo)
-            conditions.append(condition.replace('#', '#'))
-        
-        existing = set(self.condition_list.get(0, tk.END))
-        for cond in conditions:
-            if cond not in existing:
-                self.condition_list.insert(tk.END, cond)
+            selected = [CONDITION_CHARS[i] for i, var in enumerate(pos_vars) if var.get()]
+            masks.append(symbol_mask(selected) or ANY_DIGIT)
+        self.insert_condition(tuple(masks))
+
+    def insert_condition(self, masks):
+        if masks not in self.condition_keys:
+            self.condition_keys.add(masks)
+            self.conditions.append(masks)
+            self.condition_list.insert(tk.END, format_condition(masks))
 
     def remove_condition(self):
         selection = self.condition_list.curselection()
         if selection:
+            self.condition_keys.discard(self.conditions.pop(selection[0]))
             self.condition_list.delete(selection[0])
 
     def clear_conditions(self):
+        self.conditions = []
+        self.condition_keys = set()
         self.condition_list.delete(0, tk.END)
 
     def export_conditions(self):
@@ -378,7 +569,7 @@ class PositionFilterWindow(tk.Toplevel):
         )
         if path:
             with open(path, 'w') as f:
-                f.write("\n".join(self.condition_list.get(0, tk.END)))
+                f.write("\n".join(format_condition(masks) for masks in self.conditions))
             messagebox.showinfo("成功", "条件已导出")
 
     def import_conditions(self):
@@ -386,56 +577,51 @@ class PositionFilterWindow(tk.Toplevel):
         if path:
             try:
                 with open(path, 'r') as f:
-                    conditions = [line.strip() for line in f if line.strip()]
-                self.condition_list.delete(0, tk.END)
-                for cond in conditions:
-                    if len(cond) == 14 and all(c in "310#" for c in cond):
-                        self.condition_list.insert(tk.END, cond)
-                messagebox.showinfo("成功", f"已导入{len(conditions)}条条件")
+                    lines = [line.strip() for line in f if line.strip()]
+                self.clear_conditions()
+                for line in lines:
+                    try:
+                        self.insert_condition(parse_condition(line))
+                    except ValueError:
+                        continue
+                messagebox.showinfo("成功", f"已导入{len(self.conditions)}条条件")
             except Exception as e:
                 messagebox.showerror("错误", f"导入失败: {str(e)}")
 
     def apply_filter(self):
-        conditions = self.condition_list.get(0, tk.END)
-        if not conditions:
+        if not self.conditions:
             messagebox.showwarning("提示", "请先添加过滤条件")
             return
         
-        filtered = []
-        for combo in self.original_data:
-            match = any(
-                all(c == '#' or combo[i] == c for i, c in enumerate(cond))
-                for cond in conditions if len(cond) == 14
-            )
-            if (self.filter_type.get() == 1 and match) or \
-               (self.filter_type.get() == 0 and not match):
-                filtered.append(combo)
-        
+        data, conditions, keep = self.original_data, list(self.conditions), self.filter_type.get() == 1
+        params = {'stage': 'position', 'conditions': [format_condition(c) for c in conditions], 'keep': keep,
+                  'mismatches': int(self.mismatches.get())}
+        self.runner.submit(lambda stop, progress: run_stage(data, params, '.', stop, progress, STAGE_CACHE),
+                           lambda filtered: self.filter_done(filtered, params), "定位过滤")
+
+    def filter_done(self, filtered, params):
         self.filtered_data = filtered
+        self.result_node = self.app.history.push(params, filtered, self.node)
         self.show_results()
         messagebox.showinfo("完成", f"过滤后剩余{len(filtered)}条")
 
     def show_results(self):
-        self.result_text.delete(1.0, tk.END)
-        self.result_text.insert(tk.END, "\n".join(self.filtered_data))
+        self.result_view.set_data(self.filtered_data)
         self.result_info.config(text=f"匹配结果：{len(self.filtered_data)}条")
 
     def save_results(self):
-        path = filedialog.asksaveasfilename(
-            defaultextension=".txt",
-            filetypes=[("文本文件", "*.txt")]
-        )
-        if path:
-            save_results(path, self.filtered_data)
-            messagebox.showinfo("成功", f"已保存{len(self.filtered_data)}条结果")
+        self.app.save_store(self.filtered_data, self)
 
     def reset_data(self):
-        self.filtered_data = self.original_data.copy()
+        self.filtered_data = self.original_data
+        self.result_node = self.node
         self.show_results()
 
     def back_to_basic(self):
-        self.app.new_combinations = set(self.filtered_data)
-        self.app.sorted_combinations = sorted(self.filtered_data)
+        self.runner.cancel()
+        self.app.history.goto(self.result_node)
+        self.app.new_combinations = self.filtered_data
+        self.app.sorted_combinations = self.filtered_data.sorted()
         self.app.deiconify()
         self.app.show_main_page()
         self.destroy()
@@ -448,26 +634,21 @@ class MysticFilterWindow(tk.Toplevel):
     def __init__(self, master, app, data, callback):
         super().__init__(master)
         self.app = app
-        self.original_data = list(data)
-        self.filtered_data = list(data)
+        self.original_data = data
+        self.filtered_data = data
+        self.node = self.result_node = app.history.cursor
         self.callback = callback
+        # 导入的赔率：规范化后的odds阶段参数（不含top_n）
+        self.odds_params = None
         self.title("玄学过滤 - 智能优化版")
         self.geometry("1400x900")  # 加宽窗口解决显示问题
         self.configure(bg="#f0f0f0")
         
-        # 初始化分页参数
-        self.current_page = 1
-        self.page_size = 20
-        self.total_pages = 0
-        
         # 统计数据和权重
         self.stats = self.calculate_statistics()
-        self.position_weights = self.get_position_weights()
         
         self.create_widgets()
-        self.update_page_controls()
-        self.show_current_page()
-        self.update_count()
+        self.result_view.set_data(self.filtered_data)
         
         # 事件绑定
         self.strength.bind("<Motion>", self.show_strength_tip)
@@ -535,13 +716,34 @@ class MysticFilterWindow(tk.Toplevel):
         ttk.Button(btn_frame, text="推荐参数", command=self.suggest_params).pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_frame, text="随机预览", command=self.preview_filter).pack(side=tk.LEFT, padx=5)
 
+        # 赔率排序：按各场3/1/0隐含概率的对数和保留最可能的前N注
+        odds_frame = ttk.LabelFrame(parent, text="赔率排序")
+        odds_frame.pack(fill=tk.X, pady=5)
+        odds_row = ttk.Frame(odds_frame)
+        odds_row.pack(fill=tk.X, pady=2)
+        ttk.Button(odds_row, text="导入赔率", command=self.import_odds).pack(side=tk.LEFT, padx=5)
+        self.odds_label = ttk.Label(odds_row, text="未导入")
+        self.odds_label.pack(side=tk.LEFT, padx=5)
+        odds_row = ttk.Frame(odds_frame)
+        odds_row.pack(fill=tk.X, pady=2)
+        ttk.Label(odds_row, text="保留前").pack(side=tk.LEFT, padx=(5, 0))
+        self.odds_top_n = ttk.Combobox(odds_row, values=["10000", "50000", "100000", "200000"], width=8)
+        self.odds_top_n.set(str(DEFAULT_ODDS_TOP_N))
+        self.odds_top_n.pack(side=tk.LEFT)
+        ttk.Label(odds_row, text="注").pack(side=tk.LEFT)
+        ttk.Button(odds_row, text="按赔率排序", command=self.start_odds).pack(side=tk.LEFT, padx=10)
+
+        self.runner = StageRunner(parent)
+        self.runner.frame.pack(pady=5)
+
         # 参数说明
         help_frame = ttk.LabelFrame(parent, text="参数说明")
         help_frame.pack(fill=tk.X)
         helps = [
             ("🔒 锚定场次", "强制要求选定的N个高频位置必须为3/1"),
             ("🛡️ 最大容错", "允许出现0的总权重值（后卫位置0的影响更大）"),
-            ("📉 收缩强度", "向左←保留更少但更优质的组合\n向右→保留更多备选组合")
+            ("📉 收缩强度", "向左←保留更少但更优质的组合\n向右→保留更多备选组合"),
+            ("🎲 赔率排序", "赔率文件14行，每行3/1/0的小数赔率或概率")
         ]
         for text, desc in helps:
             frame = ttk.Frame(help_frame)
@@ -550,33 +752,15 @@ class MysticFilterWindow(tk.Toplevel):
             ttk.Label(frame, text=desc).pack(side=tk.LEFT)
 
     def create_results(self, parent):
-        # 结果文本框
-        self.result_text = tk.Text(parent, height=25, width=60, 
-                                 font=('Consolas', 9), wrap=tk.NONE)
-        vsb = ttk.Scrollbar(parent, orient="vertical", command=self.result_text.yview)
-        hsb = ttk.Scrollbar(parent, orient="horizontal", command=self.result_text.xview)
-        self.result_text.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
-        
-        self.result_text.grid(row=0, column=0, sticky="nsew")
-        vsb.grid(row=0, column=1, sticky="ns")
-        hsb.grid(row=1, column=0, sticky="ew")
-        
-        # 分页控制
-        page_frame = ttk.Frame(parent)
-        page_frame.grid(row=2, column=0, pady=5)
-        self.prev_btn = ttk.Button(page_frame, text="◀", command=self.prev_page)
-        self.page_label = ttk.Label(page_frame, text="0/0")
-        self.next_btn = ttk.Button(page_frame, text="▶", command=self.next_page)
-        self.count_label = ttk.Label(page_frame, text="共0条")
-        
-        self.prev_btn.pack(side=tk.LEFT)
-        self.page_label.pack(side=tk.LEFT, padx=5)
-        self.next_btn.pack(side=tk.LEFT)
-        self.count_label.pack(side=tk.LEFT, padx=10)
+        # 结果列表（带分页控制）
+        self.result_view = ResultView(parent, height=25, width=60)
+        self.result_view.grid(row=0, column=0, sticky="nsew")
+        parent.grid_rowconfigure(0, weight=1)
+        parent.grid_columnconfigure(0, weight=1)
         
         # 操作按钮
         action_frame = ttk.Frame(parent)
-        action_frame.grid(row=3, column=0, pady=5)
+        action_frame.grid(row=1, column=0, pady=5)
         ttk.Button(action_frame, text="确认继续", command=self.on_close).pack(side=tk.LEFT, padx=5)
         ttk.Button(action_frame, text="返回上一步", command=self.back_to_basic).pack(side=tk.LEFT, padx=5)
         ttk.Button(action_frame, text="重置数据", command=self.reset_data).pack(side=tk.LEFT, padx=5)
@@ -584,27 +768,14 @@ class MysticFilterWindow(tk.Toplevel):
         ttk.Button(action_frame, text="保存结果", command=self.save_results).pack(side=tk.LEFT, padx=5)
 
     def save_results(self):
-        path = filedialog.asksaveasfilename(
-            defaultextension=".txt",
-            filetypes=[("文本文件", "*.txt")]
-        )
-        if path:
-            save_results(path, self.filtered_data)
-            messagebox.showinfo("成功", f"已保存{len(self.filtered_data)}条结果")
+        self.app.save_store(self.filtered_data, self)
             
     def calculate_statistics(self):
-        stats = defaultdict(lambda: defaultdict(int))
-        for combo in self.original_data:
-            for idx, c in enumerate(combo):
-                if c in ['3','1']:
-                    stats['position'][idx] += 1
-            for i in range(len(combo)-2):
-                stats['patterns'][combo[i:i+3]] += 1
-        return stats
+        return combo_statistics(self.original_data)
 
     def draw_frequency_chart(self):
         self.stats_chart.delete("all")
-        max_freq = max(self.stats['position'].values()) or 1
+        max_freq = int(self.stats['position'].max()) or 1
         
         # 绘制坐标轴
         self.stats_chart.create_line(30, 20, 30, 130, width=2)
@@ -634,60 +805,47 @@ class MysticFilterWindow(tk.Toplevel):
             anchor_num = int(self.anchor_count.get())
             max_tolerance = float(self.tolerance.get())
             strength = self.strength.get()
-            
-            # 智能锚定
-            anchors = self.select_anchor_fields(anchor_num)
-            filtered = [c for c in self.original_data 
-                       if all(c[idx] in ['3','1'] for idx in anchors)]
-            
-            # 动态容错
-            filtered = self.apply_tolerance(filtered, max_tolerance)
-            
-            # 智能收缩
-            if filtered:
-                filtered = self.smart_shrink(filtered, strength)
-            
-            self.filtered_data = filtered
-            self.current_page = 1
-            self.total_pages = max(1, (len(filtered) + self.page_size - 1) // self.page_size)
-            self.update_page_controls()
-            self.show_current_page()
-            self.update_count()
-            messagebox.showinfo("完成", f"过滤后剩余：{len(filtered)}条")
-            
-        except Exception as e:
+        except ValueError as e:
             messagebox.showerror("错误", str(e))
+            return
+        
+        # 智能锚定 -> 动态容错 -> 智能收缩
+        data = self.original_data
+        params = {'stage': 'mystic', 'anchor_count': anchor_num,
+                  'tolerance': max_tolerance, 'strength': strength}
+        self.runner.submit(lambda stop, progress: run_stage(data, params, '.', stop, progress, STAGE_CACHE),
+                           lambda filtered: self.filter_done(filtered, params), "玄学过滤")
+
+    def filter_done(self, filtered, params):
+        self.filtered_data = filtered
+        self.result_node = self.app.history.push(params, filtered, self.node)
+        self.result_view.set_data(filtered)
+        messagebox.showinfo("完成", f"过滤后剩余：{len(filtered)}条")
+
+    def import_odds(self):
+        path = filedialog.askopenfilename(parent=self, filetypes=[("文本文件", "*.txt"), ("所有文件", "*.*")])
+        if not path:
+            return
+        try:
+            self.odds_params = normalize_stage({'stage': 'odds', 'odds_file': path})
+        except (OSError, ValueError) as e:
+            messagebox.showerror("错误", f"赔率导入失败：{str(e)}", parent=self)
+            return
+        self.odds_label.config(text=os.path.basename(path))
 
-    def select_anchor_fields(self, num):
-        sorted_pos = sorted(self.stats['position'].items(), key=lambda x:x[1], reverse=True)
-        return [x[0] for x in sorted_pos[:num]]
-
-    def apply_tolerance(self, data, max_tolerance):
-        return [c for c in data if 
-               sum(self.position_weights[idx] for idx,ch in enumerate(c) if ch == '0') <= max_tolerance]
-
-    def get_position_weights(self):
-        return {
-            0:0.8, 1:0.9, 2:1.0, 3:1.1, 
-            4:0.7, 5:0.8, 6:0.9, 7:1.0,
-            8:0.6, 9:0.7, 10:0.5, 11:0.6,
-            12:0.4, 13:0.5
-        }
-
-    def smart_shrink(self, data, strength):
-        scored = []
-        for combo in data:
-            score = 0
-            # 模式得分
-            for i in range(len(combo)-2):
-                score += self.stats['patterns'].get(combo[i:i+3], 0)
-            # 位置得分
-            score += sum(self.stats['position'][idx] for idx, c in enumerate(combo) if c in ['3','1'])
-            scored.append( (combo, score) )
-        
-        scored.sort(key=lambda x:x[1], reverse=True)
-        keep_count = max(1, int(len(scored)*strength/100))
-        return [x[0] for x in scored[:keep_count]]
+    def start_odds(self):
+        if self.odds_params is None:
+            messagebox.showwarning("提示", "请先导入赔率文件", parent=self)
+            return
+        try:
+            top_n = int(self.odds_top_n.get())
+        except ValueError:
+            messagebox.showerror("错误", "保留注数必须为整数", parent=self)
+            return
+        data = self.original_data
+        params = {'stage': 'odds', 'odds': self.odds_params['odds'], 'top_n': top_n}
+        self.runner.submit(lambda stop, progress: run_stage(data, params, '.', stop, progress, STAGE_CACHE),
+                           lambda filtered: self.filter_done(filtered, params), "赔率排序")
 
     def suggest_params(self):
         total = len(self.original_data)
@@ -699,57 +857,34 @@ class MysticFilterWindow(tk.Toplevel):
         messagebox.showinfo("参数推荐", f"推荐参数：\n容错次数：{suggest_tolerance}\n收缩强度：{suggest_strength}%")
 
     def reset_data(self):
-        self.filtered_data = self.original_data.copy()
-        self.current_page = 1
-        self.total_pages = max(1, (len(self.filtered_data) + self.page_size - 1) // self.page_size)
-        self.update_page_controls()
-        self.show_current_page()
-        self.update_count()
+        self.filtered_data = self.original_data
+        self.result_node = self.node
+        self.result_view.set_data(self.filtered_data)
         messagebox.showinfo("重置完成", "已恢复初始数据")
 
     def back_to_basic(self):
+        self.runner.cancel()
         self.app.deiconify()
         self.destroy()
 
     def skip_step(self):
-        self.app.new_combinations = set(self.original_data)
+        self.runner.cancel()
+        self.app.history.goto(self.node)
+        self.app.new_combinations = self.original_data
         self.callback()
         self.destroy()
 
-    def update_page_controls(self):
-        self.prev_btn["state"] = "normal" if self.current_page > 1 else "disabled"
-        self.next_btn["state"] = "normal" if self.current_page < self.total_pages else "disabled"
-        self.page_label["text"] = f"{self.current_page}/{self.total_pages}"
-
-    def show_current_page(self):
-        start = (self.current_page-1)*self.page_size
-        end = start + self.page_size
-        self.result_text.delete(1.0, tk.END)
-        self.result_text.insert(tk.END, "\n".join(self.filtered_data[start:end]))
-
-    def prev_page(self):
-        if self.current_page > 1:
-            self.current_page -= 1
-            self.update_page_controls()
-            self.show_current_page()
-
-    def next_page(self):
-        if self.current_page < self.total_pages:
-            self.current_page += 1
-            self.update_page_controls()
-            self.show_current_page()
-
-    def update_count(self):
-        self.count_label.config(text=f"共{len(self.filtered_data)}条")
-
     def preview_filter(self):
         if self.filtered_data:
-            sample = random.sample(self.filtered_data, min(5, len(self.filtered_data)))
+            rows = random.sample(range(len(self.filtered_data)), min(5, len(self.filtered_data)))
+            sample = self.filtered_data.select(rows).to_strings()
             messagebox.showinfo("预览", "\n".join(sample))
 
     def on_close(self):
-        self.app.new_combinations = set(self.filtered_data)
-        self.app.sorted_combinations = sorted(self.filtered_data)
+        self.runner.cancel()
+        self.app.history.goto(self.result_node)
+        self.app.new_combinations = self.filtered_data
+        self.app.sorted_combinations = self.filtered_data.sorted()
         if self.callback:
             self.callback()
         self.destroy()
@@ -778,6 +913,234 @@ class MysticFilterWindow(tk.Toplevel):
         ttk.Label(tip, text=text, background="#FFFFE0", borderwidth=1, relief="solid").pack()
         self.after(1500, tip.destroy)
 
+# -------------------- 中奖评估窗口 --------------------
+class HitEvalWindow(tk.Toplevel):
+    """输入开奖结果，统计各注命中场次并列出中奖组合"""
+    def __init__(self, master, app, data):
+        super().__init__(master)
+        self.app = app
+        self.data = data
+        self.reports = []
+        self.title("中奖评估")
+        self.geometry("760x760")
+        self.configure(bg="#f0f0f0")
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        self.create_widgets()
+
+    def create_widgets(self):
+        input_frame = ttk.LabelFrame(self, text="开奖结果（每行一期，取消场次用#或*）")
+        input_frame.pack(fill=tk.X, padx=10, pady=10)
+        self.result_input = tk.Text(input_frame, height=4, width=40, font=('Consolas', 10))
+        self.result_input.pack(fill=tk.X, padx=5, pady=5)
+        
+        ctrl_frame = ttk.Frame(input_frame)
+        ctrl_frame.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Label(ctrl_frame, text="最低命中：").pack(side=tk.LEFT)
+        self.min_hits = ttk.Combobox(ctrl_frame, values=[str(i) for i in range(14, 8, -1)], width=4, state="readonly")
+        self.min_hits.set(str(DEFAULT_MIN_HITS))
+        self.min_hits.pack(side=tk.LEFT)
+        ttk.Button(ctrl_frame, text="开始评估", command=self.start_eval).pack(side=tk.LEFT, padx=10)
+        ttk.Button(ctrl_frame, text="导入组合文件", command=self.load_data).pack(side=tk.LEFT, padx=5)
+        self.data_label = ttk.Label(ctrl_frame, text=f"评估对象：当前结果{len(self.data)}条")
+        self.data_label.pack(side=tk.LEFT, padx=10)
+        
+        self.runner = StageRunner(self)
+        self.runner.frame.pack(pady=5)
+        
+        report_frame = ttk.LabelFrame(self, text="命中统计（选中一期查看中奖组合）")
+        report_frame.pack(fill=tk.X, padx=10, pady=5)
+        self.report_list = tk.Listbox(report_frame, height=5, font=('Consolas', 9))
+        self.report_list.pack(fill=tk.X, padx=5, pady=5)
+        self.report_list.bind("<<ListboxSelect>>", lambda e: self.show_winners())
+        
+        result_frame = ttk.LabelFrame(self, text="中奖组合")
+        result_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.result_view = ResultView(result_frame, height=15, width=60)
+        self.result_view.pack(fill=tk.BOTH, expand=True)
+        ttk.Button(self.result_view.bar, text="保存结果", command=self.save_results).pack(side=tk.LEFT, padx=10)
+
+    def load_data(self):
+        path = filedialog.askopenfilename(parent=self, filetypes=[
+            ("组合文件", "*.txt *.txt.gz *.gz *.zst *.bin"), ("所有文件", "*.*")])
+        if not path:
+            return
+        try:
+            store, bad_lines, bad_count = load_combinations(path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("错误", f"组合文件加载失败：{str(e)}", parent=self)
+            return
+        if bad_count:
+            messagebox.showwarning("格式错误", f"已忽略{bad_count}行：\n{format_bad_lines(bad_lines, bad_count)}", parent=self)
+        self.data = store
+        self.data_label.config(text=f"评估对象：{len(store)}条")
+
+    def start_eval(self):
+        results = [line.strip() for line in self.result_input.get(1.0, tk.END).splitlines() if line.strip()]
+        if not results:
+            messagebox.showwarning("提示", "请输入开奖结果", parent=self)
+            return
+        data, min_hits = self.data, int(self.min_hits.get())
+        self.runner.submit(lambda stop, progress: evaluate_hits(data, results, min_hits, stop, progress),
+                           lambda reports: self.eval_done(reports, min_hits), "中奖评估")
+
+    def eval_done(self, reports, min_hits):
+        self.reports = reports
+        self.report_list.delete(0, tk.END)
+        for report in reports:
+            self.report_list.insert(tk.END, format_hit_report(report, min_hits))
+        if reports:
+            self.report_list.selection_set(0)
+            self.show_winners()
+
+    def show_winners(self):
+        selection = self.report_list.curselection()
+        if selection:
+            report = self.reports[selection[0]]
+            self.result_view.set_data(report['winners'], report['hits'], "{}中")
+
+    def save_results(self):
+        self.app.save_store(self.result_view.store, self)
+
+    def on_close(self):
+        self.runner.cancel()
+        self.destroy()
+
+# -------------------- 缩水窗口 --------------------
+class CoverWindow(tk.Toplevel):
+    """从当前结果中选出尽量少的注，使每注都在某个入选注的覆盖半径之内"""
+    def __init__(self, master, app):
+        super().__init__(master)
+        self.app = app
+        self.node = self.result_node = app.history.cursor
+        self.data = app.history.store()
+        self.tickets = None
+        self.title("缩水")
+        self.geometry("640x700")
+        self.configure(bg="#f0f0f0")
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        self.create_widgets()
+
+    def create_widgets(self):
+        ctrl_frame = ttk.Frame(self)
+        ctrl_frame.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Label(ctrl_frame, text="覆盖半径：").pack(side=tk.LEFT)
+        # 半径r：开奖结果在当前数据中时保证14-r中
+        self.radius = ttk.Combobox(ctrl_frame, values=["1（保证13中）", "2（保证12中）", "3（保证11中）"],
+                                   width=12, state="readonly")
+        self.radius.current(0)
+        self.radius.pack(side=tk.LEFT)
+        ttk.Label(ctrl_frame, text="时间预算(秒)：").pack(side=tk.LEFT, padx=(10, 0))
+        self.time_budget = ttk.Combobox(ctrl_frame, values=["30", "60", "120", "300", "600"], width=5)
+        self.time_budget.set(f"{COVER_TIME_BUDGET:g}")
+        self.time_budget.pack(side=tk.LEFT)
+        ttk.Button(ctrl_frame, text="开始缩水", command=self.start_cover).pack(side=tk.LEFT, padx=10)
+        
+        self.info_label = ttk.Label(self, text=f"当前结果：{len(self.data)}注")
+        self.info_label.pack(pady=5)
+        self.runner = StageRunner(self)
+        self.runner.frame.pack(pady=5)
+        
+        result_frame = ttk.LabelFrame(self, text="入选组合")
+        result_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.result_view = ResultView(result_frame, height=15, width=50)
+        self.result_view.pack(fill=tk.BOTH, expand=True)
+        ttk.Button(self.result_view.bar, text="保存结果", command=self.save_results).pack(side=tk.LEFT, padx=10)
+        ttk.Button(self.result_view.bar, text="应用到主窗口", command=self.apply_result).pack(side=tk.LEFT, padx=5)
+
+    def start_cover(self):
+        try:
+            time_budget = float(self.time_budget.get())
+        except ValueError:
+            messagebox.showerror("错误", "时间预算必须为数字", parent=self)
+            return
+        data = self.data
+        params = {'stage': 'cover', 'radius': self.radius.current() + 1, 'time_budget': time_budget}
+        self.runner.submit(lambda stop, progress: cover_reduce(data, params['radius'], time_budget, stop, progress),
+                           lambda result: self.cover_done(result, params), "缩水")
+
+    def cover_done(self, result, params):
+        self.tickets, info = result
+        self.result_node = self.app.history.push(params, self.tickets, self.node)
+        self.info_label.config(text=format_cover_report(info))
+        self.result_view.set_data(self.tickets)
+
+    def save_results(self):
+        if self.tickets is not None:
+            self.app.save_store(self.tickets, self)
+
+    def apply_result(self):
+        self.runner.cancel()
+        self.app.history.goto(self.result_node)
+        self.app.show_history_stage()
+        self.destroy()
+
+    def on_close(self):
+        self.runner.cancel()
+        self.destroy()
+
+# -------------------- 历史回测窗口 --------------------
+class BacktestWindow(tk.Toplevel):
+    """用历史开奖文件回测当前阶段路径，列出各阶段与各条件的通过率"""
+    def __init__(self, master, app):
+        super().__init__(master)
+        history = app.history
+        path = history.path() if history.nodes else []
+        # 首节点为数据源，其后各节点参数即流程配置中的阶段
+        self.source = history.store(path[0]) if path else None
+        self.stages = [history.nodes[idx].params for idx in path[1:]]
+        self.title("历史回测")
+        self.geometry("640x560")
+        self.configure(bg="#f0f0f0")
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        self.create_widgets()
+
+    def create_widgets(self):
+        ctrl_frame = ttk.Frame(self)
+        ctrl_frame.pack(fill=tk.X, padx=10, pady=10)
+        ttk.Button(ctrl_frame, text="选择历史开奖文件", command=self.start_backtest).pack(side=tk.LEFT, padx=5)
+        ttk.Label(ctrl_frame, text="回测阶段：" + (" → ".join(STAGE_TITLES[params['stage']] for params in self.stages) or "无"))\
+            .pack(side=tk.LEFT, padx=10)
+        
+        self.runner = StageRunner(self)
+        self.runner.frame.pack(pady=5)
+        
+        report_frame = ttk.LabelFrame(self, text="通过率（阶段整体 / 累计存活，缩进为单项条件）")
+        report_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.report_text = tk.Text(report_frame, font=('Consolas', 10), state=tk.DISABLED)
+        self.report_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+    def start_backtest(self):
+        if not self.stages:
+            messagebox.showwarning("提示", "当前没有可回测的阶段", parent=self)
+            return
+        path = filedialog.askopenfilename(parent=self, filetypes=[
+            ("开奖文件", "*.txt *.txt.gz *.gz *.zst"), ("所有文件", "*.*")])
+        if not path:
+            return
+        try:
+            draws, skipped = load_draws(path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("错误", f"开奖文件加载失败：{str(e)}", parent=self)
+            return
+        source, stages = self.source, self.stages
+        self.runner.submit(lambda stop, progress: backtest(draws, stages, source, '.', STAGE_CACHE, stop, progress),
+                           lambda rows: self.backtest_done(rows, len(draws), skipped), "历史回测")
+
+    def backtest_done(self, rows, total, skipped):
+        lines = [f"历史开奖{total}期" + (f"，跳过{skipped}行（含取消场次或格式错误）" if skipped else "")]
+        lines += format_backtest(rows, total)
+        self.report_text.config(state=tk.NORMAL)
+        self.report_text.delete(1.0, tk.END)
+        self.report_text.insert(tk.END, "\n".join(lines))
+        self.report_text.config(state=tk.DISABLED)
+
+    def on_close(self):
+        self.runner.cancel()
+        self.destroy()
+
 # -------------------- 主程序 --------------------
 class CombinationApp(tk.Tk):
     def __init__(self):
@@ -787,20 +1150,21 @@ class CombinationApp(tk.Tk):
         self.configure(bg="#f0f0f0")
         self.protocol("WM_DELETE_WINDOW", self.quit_app)
         
-        self.original_combinations = set()
-        self.new_combinations = set()
-        self.sorted_combinations = []
+        self.original_combinations = ComboStore()
+        self.new_combinations = ComboStore()
+        self.sorted_combinations = ComboStore()
+        # 阶段历史：参数格式与命令行流程配置一致，筛选结果以掩码相对父阶段保存
+        self.history = StageHistory()
         self.checkbox_vars = []
         self.checkboxes = []
         self.stop_event = threading.Event()
         self.progress_queue = queue.Queue()
-        self.current_page = 1
-        self.page_size = 20
-        self.total_pages = 0
+        self.progress_state = ProgressState()
+        self.progress_state.finish()
         
         self.create_widgets()
         self.setup_styles()
-        self.after(100, self.process_queue)
+        self.after(PROGRESS_INTERVAL, self.process_queue)
         
         exit_btn = ttk.Button(self, text="退出程序", command=self.quit_app)
         exit_btn.pack(side=tk.BOTTOM, pady=10)
@@ -819,6 +1183,10 @@ class CombinationApp(tk.Tk):
         ttk.Button(file_frame, text="导入数据源", command=self.load_file).pack(side=tk.LEFT, padx=5)
         ttk.Button(file_frame, text="导入模板", command=self.load_template).pack(side=tk.LEFT, padx=5)
         ttk.Button(file_frame, text="清空选项", command=self.clear_checkboxes).pack(side=tk.LEFT, padx=5)
+        ttk.Button(file_frame, text="保存会话", command=self.save_session).pack(side=tk.LEFT, padx=5)
+        ttk.Button(file_frame, text="打开会话", command=self.open_session).pack(side=tk.LEFT, padx=5)
+        ttk.Button(file_frame, text="中奖评估", command=lambda: HitEvalWindow(self, self, self.sorted_combinations)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(file_frame, text="历史回测", command=lambda: BacktestWindow(self, self)).pack(side=tk.LEFT, padx=5)
         
         self.status_label = ttk.Label(self, text="已加载组合：0")
         self.status_label.pack(pady=5)
@@ -862,6 +1230,20 @@ class CombinationApp(tk.Tk):
         
         self.progress = ttk.Progressbar(self, orient="horizontal", length=500, mode="determinate")
         self.progress.pack(pady=10)
+        self.progress_label = ttk.Label(self, text="")
+        self.progress_label.pack()
+        
+        cache_frame = ttk.Frame(self)
+        cache_frame.pack()
+        ttk.Label(cache_frame, text="缓存上限(MB)：").pack(side=tk.LEFT)
+        self.cache_budget = ttk.Combobox(cache_frame, values=["64", "256", "1024", "4096"], width=6)
+        self.cache_budget.set(str(STAGE_CACHE.budget >> 20))
+        self.cache_budget.bind("<<ComboboxSelected>>", lambda e: self.apply_cache_budget())
+        self.cache_budget.bind("<Return>", lambda e: self.apply_cache_budget())
+        self.cache_budget.pack(side=tk.LEFT)
+        ttk.Button(cache_frame, text="清空缓存", command=STAGE_CACHE.clear).pack(side=tk.LEFT, padx=5)
+        self.cache_label = ttk.Label(cache_frame, text="")
+        self.cache_label.pack(side=tk.LEFT, padx=5)
         
         ctrl_frame = ttk.Frame(self)
         ctrl_frame.pack(pady=10)
@@ -874,23 +1256,22 @@ class CombinationApp(tk.Tk):
         self.cancel_btn.pack(side=tk.LEFT, padx=5)
         self.next_btn.pack(side=tk.LEFT, padx=5)
         
-        self.result_text = tk.Text(self, height=6, width=70, font=('Consolas', 9))
-        self.result_text.pack(pady=10, fill=tk.BOTH, expand=True, padx=10)
+        ttk.Label(ctrl_frame, text="分片条数：").pack(side=tk.LEFT, padx=(10, 0))
+        self.part_size = ttk.Combobox(ctrl_frame, values=["0", "10000", "50000", "100000"], width=8)
+        self.part_size.set("0")
+        self.part_size.pack(side=tk.LEFT)
         
-        page_frame = ttk.Frame(self)
-        page_frame.pack(pady=5)
-        
-        self.prev_page_btn = ttk.Button(page_frame, text="◀", width=3, command=self.prev_main_page)
-        self.page_label_main = ttk.Label(page_frame, text="0/0")
-        self.next_page_btn = ttk.Button(page_frame, text="▶", width=3, command=self.next_main_page)
-        self.count_label_main = ttk.Label(page_frame, text="共0条")
-        ttk.Button(page_frame, text="清空结果", command=self.clear_results).pack(side=tk.LEFT, padx=5)
-        ttk.Button(page_frame, text="保存结果", command=self.save_file).pack(side=tk.LEFT, padx=5)
-        
-        self.prev_page_btn.pack(side=tk.LEFT)
-        self.page_label_main.pack(side=tk.LEFT)
-        self.next_page_btn.pack(side=tk.LEFT)
-        self.count_label_main.pack(side=tk.LEFT, padx=10)
+        self.result_view = ResultView(self, height=6, width=70)
+        self.result_view.pack(pady=10, fill=tk.BOTH, expand=True, padx=10)
+        self.undo_btn = ttk.Button(self.result_view.bar, text="撤销", width=4, state="disabled", command=self.undo_stage)
+        self.redo_btn = ttk.Button(self.result_view.bar, text="重做", width=4, state="disabled", command=self.redo_stage)
+        self.stage_label = ttk.Label(self.result_view.bar, text="")
+        self.undo_btn.pack(side=tk.LEFT, padx=(10, 2))
+        self.redo_btn.pack(side=tk.LEFT, padx=2)
+        self.stage_label.pack(side=tk.LEFT, padx=5)
+        ttk.Button(self.result_view.bar, text="缩水", command=self.open_cover).pack(side=tk.LEFT, padx=5)
+        ttk.Button(self.result_view.bar, text="清空结果", command=self.clear_results).pack(side=tk.LEFT, padx=5)
+        ttk.Button(self.result_view.bar, text="保存结果", command=self.save_file).pack(side=tk.LEFT, padx=5)
 
     def safe_style_update(self, text, state, position, index):
         if position < len(self.checkboxes) and index < 3:
@@ -914,9 +1295,19 @@ class CombinationApp(tk.Tk):
                 self.update_checkbox_style(["3","1","0"][idx], 0, pos, idx)
     
     def load_file(self):
-        path = filedialog.askopenfilename(filetypes=[("文本文件", "*.txt")])
+        path = filedialog.askopenfilename(filetypes=[
+            ("数据源", "*.txt *.txt.gz *.gz *.zst"), ("所有文件", "*.*")])
         if path:
-            self.original_combinations = load_original_combinations(path)
+            try:
+                store, bad_lines, bad_count = load_combinations(path)
+            except (OSError, ValueError) as e:
+                messagebox.showerror("错误", f"数据源加载失败：{str(e)}")
+                return
+            if bad_count and not messagebox.askyesno(
+                    "格式错误", f"发现{bad_count}行格式错误：\n{format_bad_lines(bad_lines, bad_count)}\n\n是否忽略这些行继续加载？"):
+                return
+            self.original_combinations = store
+            self.history.reset({'stage': 'source', 'path': path}, store)
             self.status_label.config(text=f"已加载组合：{len(self.original_combinations)}")
             messagebox.showinfo("成功", "数据源加载完成")
     
@@ -942,21 +1333,88 @@ class CombinationApp(tk.Tk):
                 for idx, c in enumerate(template):
                     position_digits[idx].add(c)
             
-            for pos in range(14):
-                var_3, var_1, var_0 = self.checkbox_vars[pos]
-                var_3.set(1 if '3' in position_digits[pos] else 0)
-                var_1.set(1 if '1' in position_digits[pos] else 0)
-                var_0.set(1 if '0' in position_digits[pos] else 0)
-                
-                self.update_checkbox_style("3", var_3.get(), pos, 0)
-                self.update_checkbox_style("1", var_1.get(), pos, 1)
-                self.update_checkbox_style("0", var_0.get(), pos, 2)
-            
+            self.apply_selection(position_digits)
             messagebox.showinfo("成功", f"已导入{len(templates)}个模板")
         
         except Exception as e:
             messagebox.showerror("错误", f"模板加载失败：{str(e)}")
     
+    def apply_selection(self, position_digits):
+        """按各位置的字符集合勾选复选框"""
+        for pos in range(14):
+            var_3, var_1, var_0 = self.checkbox_vars[pos]
+            var_3.set(1 if '3' in position_digits[pos] else 0)
+            var_1.set(1 if '1' in position_digits[pos] else 0)
+            var_0.set(1 if '0' in position_digits[pos] else 0)
+            
+            self.update_checkbox_style("3", var_3.get(), pos, 0)
+            self.update_checkbox_style("1", var_1.get(), pos, 1)
+            self.update_checkbox_style("0", var_0.get(), pos, 2)
+    
+    def undo_stage(self):
+        self.history.undo()
+        self.show_history_stage()
+    
+    def redo_stage(self):
+        self.history.redo()
+        self.show_history_stage()
+    
+    def open_cover(self):
+        if not self.history.nodes or not len(self.history.store()):
+            messagebox.showwarning("提示", "当前没有可缩水的结果")
+            return
+        CoverWindow(self, self)
+    
+    def show_history_stage(self):
+        """以阶段历史游标处的结果作为当前数据"""
+        self.new_combinations = self.history.store()
+        self.sorted_combinations = self.new_combinations
+        self.show_main_page()
+    
+    def save_session(self):
+        if not self.history.nodes:
+            messagebox.showwarning("提示", "请先导入数据源")
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".snap", filetypes=[("会话快照", "*.snap")])
+        if not path:
+            return
+        # 保存数据源到当前阶段的历史路径
+        stages = self.history.stages()
+        try:
+            save_snapshot(path, stages, {'current': len(stages) - 1})
+        except OSError as e:
+            messagebox.showerror("错误", f"会话保存失败：{str(e)}")
+            return
+        messagebox.showinfo("成功", f"已保存{len(stages)}个阶段")
+    
+    def open_session(self):
+        path = filedialog.askopenfilename(filetypes=[("会话快照", "*.snap")])
+        if not path:
+            return
+        try:
+            stages, meta = load_snapshot(path)
+        except (OSError, ValueError, KeyError) as e:
+            messagebox.showerror("错误", f"会话打开失败：{str(e)}")
+            return
+        if not stages:
+            messagebox.showerror("错误", "会话快照为空")
+            return
+        # 快照数组已是mmap，直接作为完整节点挂入历史，无需重算掩码
+        self.history.reset(*stages[0])
+        for params, store in stages[1:]:
+            self.history.push(params, store, masked=False)
+        self.history.goto(meta.get('current', len(stages) - 1))
+        self.original_combinations = stages[0][1]
+        self.new_combinations = self.history.store()
+        self.sorted_combinations = self.new_combinations
+        for params, _ in stages:
+            if params.get('stage') == 'generate':
+                self.apply_selection([set(chars or '310') for chars in params['selected']])
+        self.status_label.config(text=f"已加载组合：{len(self.original_combinations)}")
+        self.show_main_page()
+        self.next_btn.config(state="normal")
+        messagebox.showinfo("成功", f"已恢复{len(stages)}个阶段，当前{len(self.new_combinations)}条")
+    
     def start_generation(self):
         if not self.original_combinations:
             messagebox.showwarning("错误", "请先导入数据源")
@@ -971,7 +1429,6 @@ class CombinationApp(tk.Tk):
     
     def generate_combinations(self):
         try:
-            self.new_combinations.clear()
             selected = []
             
             for pos in range(14):
@@ -981,86 +1438,83 @@ class CombinationApp(tk.Tk):
                 if var_1.get(): options.append('1')
                 if var_0.get(): options.append('0')
                 selected.append(options if options else ['3','1','0'])
+            self.generate_params = {'stage': 'generate', 'selected': [''.join(options) for options in selected]}
             
-            total = len(self.original_combinations)
-            processed = 0
-            
-            for batch in self.chunked_list(list(self.original_combinations), 100):
-                if self.stop_event.is_set():
-                    break
-                
-                for combo in batch:
-                    parts = []
-                    for idx, char in enumerate(combo):
-                        parts.append(selected[idx])
-                    
-                    for variation in product(*parts):
-                        new_combo = ''.join(variation)
-                        if new_combo not in self.original_combinations:
-                            self.new_combinations.add(new_combo)
-                    
-                    processed += 1
-                    self.progress_queue.put(('progress', processed/total*100))
-                
-                self.progress_queue.put(('partial', len(self.new_combinations)))
-            
-            self.sorted_combinations = sorted(self.new_combinations)
-            self.total_pages = (len(self.sorted_combinations) + self.page_size -1) // self.page_size
+            source = self.original_combinations
+            generate = lambda: generate_new_combinations(source, selected, self.stop_event, self.progress_state)
+            self.new_combinations = STAGE_CACHE.run(
+                stage_key(source, normalize_stage(self.generate_params)), generate, self.stop_event)
+            self.sorted_combinations = self.new_combinations
             self.progress_queue.put(('done', len(self.new_combinations)))
         
         except Exception as e:
             self.progress_queue.put(('error', str(e)))
+        
+        finally:
+            self.progress_state.finish()
+    
+    def show_progress(self):
+        """按快照刷新进度条与速度、剩余时间、峰值内存"""
+        fraction, done, found, rate, eta, peak = self.progress_state.snapshot()
+        self.progress['value'] = fraction*100
+        text = f"已生成 {found} 条 | {rate:,.0f} 条/秒"
+        if eta is not None:
+            text += f" | 剩余 {eta:.1f} 秒"
+        if peak is not None:
+            text += f" | 峰值内存 {peak/2**20:.0f} MB"
+        self.progress_label.config(text=text)
     
-    def chunked_list(self, lst, size):
-        for i in range(0, len(lst), size):
-            yield lst[i:i+size]
+    def apply_cache_budget(self):
+        try:
+            budget = int(self.cache_budget.get())
+        except ValueError:
+            messagebox.showerror("错误", "缓存上限必须为整数")
+            return
+        STAGE_CACHE.set_budget(max(0, budget) << 20)
+    
+    def show_cache_stats(self):
+        stats = STAGE_CACHE.stats()
+        self.cache_label.config(
+            text=f"命中 {stats['hits']} | 未命中 {stats['misses']} | 淘汰 {stats['evictions']} | "
+                 f"占用 {stats['bytes']/2**20:.1f}/{stats['budget']/2**20:.0f} MB")
     
     def process_queue(self):
+        if self.progress_state.running:
+            self.show_progress()
+        self.show_cache_stats()
         try:
             while True:
                 msg_type, data = self.progress_queue.get_nowait()
                 
-                if msg_type == 'progress':
-                    self.progress['value'] = data
-                elif msg_type == 'partial':
-                    self.result_text.delete(1.0, tk.END)
-                    self.result_text.insert(tk.END, f"已生成 {data} 条新组合...\n")
-                elif msg_type == 'done':
+                if msg_type == 'done':
+                    self.show_progress()
                     self.progress['value'] = 100
-                    self.current_page = 1
-                    self.total_pages = max(1, (data + self.page_size -1) // self.page_size)
-                    self.page_label_main.config(text=f"{self.current_page}/{self.total_pages}")
-                    self.count_label_main.config(text=f"共{data}条")
+                    self.start_btn.config(state="normal")
+                    self.cancel_btn.config(state="disabled")
+                    self.history.push(self.generate_params, self.new_combinations, 0)
                     self.show_main_page()
                     self.next_btn.config(state="normal")
                     messagebox.showinfo("完成", f"生成完成，共{data}条新组合")
                 elif msg_type == 'error':
+                    self.start_btn.config(state="normal")
+                    self.cancel_btn.config(state="disabled")
                     messagebox.showerror("错误", data)
-                
-                self.update()
         
         except queue.Empty:
             pass
         
-        self.after(100, self.process_queue)
+        self.after(PROGRESS_INTERVAL, self.process_queue)
     
     def show_main_page(self):
-        start = (self.current_page -1) * self.page_size
-        end = start + self.page_size
-        self.result_text.delete(1.0, tk.END)
-        self.result_text.insert(tk.END, "\n".join(self.sorted_combinations[start:end]))
-    
-    def prev_main_page(self):
-        if self.current_page > 1:
-            self.current_page -= 1
-            self.page_label_main.config(text=f"{self.current_page}/{self.total_pages}")
-            self.show_main_page()
-    
-    def next_main_page(self):
-        if self.current_page < self.total_pages:
-            self.current_page += 1
-            self.page_label_main.config(text=f"{self.current_page}/{self.total_pages}")
-            self.show_main_page()
+        self.result_view.set_data(self.sorted_combinations)
+        history = self.history
+        self.undo_btn.config(state="normal" if history.can_undo else "disabled")
+        self.redo_btn.config(state="normal" if history.can_redo else "disabled")
+        if history.nodes:
+            stages = [STAGE_TITLES.get(history.nodes[idx].params.get('stage'), '?') for idx in history.path()]
+            self.stage_label.config(text=" → ".join(stages))
+        else:
+            self.stage_label.config(text="")
     
     def cancel_generation(self):
         self.stop_event.set()
@@ -1069,13 +1523,32 @@ class CombinationApp(tk.Tk):
         messagebox.showinfo("提示", "操作已取消")
     
     def save_file(self):
+        self.save_store(self.new_combinations)
+    
+    def save_store(self, store, parent=None):
+        """按编码顺序保存结果，分片条数大于0时拆分为多个文件"""
+        parent = parent or self
         path = filedialog.asksaveasfilename(
+            parent=parent,
             defaultextension=".txt",
-            filetypes=[("文本文件", "*.txt")]
+            filetypes=[("文本文件", "*.txt"), ("压缩文本", "*.txt.gz *.txt.zst"), ("紧凑二进制", "*.bin")]
         )
-        if path:
-            save_results(path, self.new_combinations)
-            messagebox.showinfo("成功", "结果已保存")
+        if not path:
+            return
+        try:
+            part_size = int(self.part_size.get() or 0)
+        except ValueError:
+            messagebox.showerror("错误", "分片条数必须为整数", parent=parent)
+            return
+        try:
+            paths = save_results(path, store, part_size)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("错误", f"保存失败：{str(e)}", parent=parent)
+            return
+        text = f"已保存{len(store)}条结果"
+        if len(paths) > 1:
+            text += f"，分为{len(paths)}个文件"
+        messagebox.showinfo("成功", text, parent=parent)
     
     def open_filter_window(self):
         if not self.original_combinations:
@@ -1083,8 +1556,9 @@ class CombinationApp(tk.Tk):
             return
         
         if not self.new_combinations:
-            self.new_combinations = self.original_combinations.copy()
-            self.sorted_combinations = sorted(self.new_combinations)
+            self.history.goto(0)
+            self.new_combinations = self.original_combinations
+            self.sorted_combinations = self.original_combinations
         
         self.withdraw()
         MysticFilterWindow(
@@ -1095,13 +1569,11 @@ class CombinationApp(tk.Tk):
         )
     
     def clear_results(self):
-        self.result_text.delete(1.0, tk.END)
-        self.new_combinations.clear()
-        self.sorted_combinations.clear()
-        self.current_page = 1
-        self.total_pages = 0
-        self.page_label_main.config(text="0/0")
-        self.count_label_main.config(text="共0条")
+        if self.history.nodes:
+            self.history.goto(0)
+        self.new_combinations = ComboStore()
+        self.sorted_combinations = ComboStore()
+        self.show_main_page()
         self.next_btn.config(state="disabled")
     
     def quit_app(self):
@@ -0,0 +1,1858 @@
+"""组合过滤引擎：生成、常规、定位、玄学各阶段的纯计算部分，不依赖tkinter
+
+命令行用法：python filter_engine.py 流程配置.json [-s 数据源] [-o 输出文件] [-S 会话快照] [-b 历史开奖]
+"""
+import argparse
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import struct
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+# -------------------- 组合存储 --------------------
+POSITIONS = 14
+UNIVERSE = 3 ** POSITIONS
+# 码值0/1/2依次对应'0'/'1'/'3'，编码大小顺序与字符串字典序一致
+DIGIT_CHARS = '013'
+DECODE_CHUNK = 1 << 16
+
+_POWERS = (3 ** np.arange(POSITIONS - 1, -1, -1)).astype(np.uint32)
+_CHAR_TO_DIGIT = np.full(256, 255, dtype=np.uint8)
+for _digit, _char in enumerate(DIGIT_CHARS):
+    _CHAR_TO_DIGIT[ord(_char)] = _digit
+_DIGIT_TO_CHAR = np.frombuffer(DIGIT_CHARS.encode('ascii'), dtype=np.uint8)
+
+def digits_to_codes(digits):
+    """(N,14)码位矩阵 -> base-3编码"""
+    codes = np.zeros(len(digits), dtype=np.uint32)
+    for pos in range(POSITIONS):
+        codes *= 3
+        codes += digits[:, pos]
+    return codes
+
+# 7位半码查表：一次除法拆成高低两半，再按表取码位
+_HALF = POSITIONS // 2
+_HALF_BASE = 3 ** _HALF
+_HALF_DIGITS = np.array(
+    [[code // 3 ** (_HALF - 1 - pos) % 3 for pos in range(_HALF)] for code in range(_HALF_BASE)],
+    dtype=np.uint8)
+
+def codes_to_digits(codes):
+    """base-3编码 -> (N,14) uint8码位矩阵"""
+    codes = np.asarray(codes, dtype=np.uint32)
+    high = codes // _HALF_BASE
+    digits = np.empty((len(codes), POSITIONS), dtype=np.uint8)
+    digits[:, :_HALF] = _HALF_DIGITS[high]
+    digits[:, _HALF:] = _HALF_DIGITS[codes - high * _HALF_BASE]
+    return digits
+
+def encode_combos(combos):
+    """将14位3/1/0字符串编码为uint32数组"""
+    combos = list(combos)
+    if not combos:
+        return np.empty(0, dtype=np.uint32)
+    raw = ''.join(combos).encode('ascii', errors='replace')
+    if len(raw) != len(combos) * POSITIONS:
+        bad = next(c for c in combos if len(c) != POSITIONS)
+        raise ValueError(f"组合格式错误：{bad}")
+    digits = _CHAR_TO_DIGIT[np.frombuffer(raw, dtype=np.uint8)].reshape(-1, POSITIONS)
+    invalid = (digits == 255).any(axis=1)
+    if invalid.any():
+        raise ValueError(f"组合格式错误：{combos[int(np.argmax(invalid))]}")
+    return digits_to_codes(digits)
+
+def decode_codes(codes):
+    """将编码解码为14位字符串列表"""
+    chars = np.ascontiguousarray(_DIGIT_TO_CHAR[codes_to_digits(codes)])
+    return chars.view(f'S{POSITIONS}').ravel().astype(f'U{POSITIONS}').tolist()
+
+class ComboStore:
+    """组合存储：每注以base-3整数存于只读uint32数组，各窗口间共享无需复制"""
+    __slots__ = ('codes', '_digest')
+
+    def __init__(self, codes=()):
+        codes = np.asarray(codes, dtype=np.uint32).view()
+        codes.flags.writeable = False
+        self.codes = codes
+        self._digest = None
+
+    @classmethod
+    def from_codes(cls, codes):
+        """由任意编码构造（去重并排序）"""
+        return cls(np.unique(np.asarray(codes, dtype=np.uint32)))
+
+    @classmethod
+    def from_strings(cls, combos):
+        return cls.from_codes(encode_combos(combos))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        for start in range(0, len(self.codes), DECODE_CHUNK):
+            yield from decode_codes(self.codes[start:start + DECODE_CHUNK])
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes
+
+    def digest(self):
+        """内容摘要（含顺序），只读数据只需计算一次"""
+        if self._digest is None:
+            self._digest = hashlib.blake2b(self.codes.tobytes(), digest_size=16).hexdigest()
+        return self._digest
+
+    def to_strings(self, start=0, stop=None):
+        """解码[start, stop)区间，仅用于显示与保存"""
+        return decode_codes(self.codes[start:stop])
+
+    def select(self, index):
+        """按布尔掩码或下标取子集，保持原有顺序"""
+        return ComboStore(self.codes[index])
+
+    def sorted(self):
+        return ComboStore(np.sort(self.codes))
+
+# -------------------- 进度通道 --------------------
+def peak_memory():
+    """进程峰值常驻内存（字节），平台不支持时返回None"""
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage',
+                    'QuotaPagedPoolUsage', 'QuotaPeakNonPagedPoolUsage',
+                    'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class ProgressState:
+    """进度快照：工作线程只覆盖最新状态，界面按固定帧率轮询，不随条数产生消息"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.start(0)
+
+    def start(self, total):
+        with self._lock:
+            self.total = total
+            self.done = 0
+            self.found = 0
+            self.started = time.perf_counter()
+            self.running = True
+
+    def update(self, done, found=None):
+        with self._lock:
+            self.done = done
+            if found is not None:
+                self.found = found
+
+    def finish(self):
+        with self._lock:
+            self.running = False
+
+    def snapshot(self):
+        """返回(进度0~1, 已处理, 已得到, 速度条/秒, 剩余秒数或None, 峰值内存字节或None)"""
+        with self._lock:
+            total, done, found = self.total, self.done, self.found
+            elapsed = time.perf_counter() - self.started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = (total - done) / rate if rate > 0 else None
+        fraction = done / total if total else 0.0
+        return fraction, done, found, rate, eta, peak_memory()
+
+class Cancelled(Exception):
+    """任务已被取消"""
+
+def check_cancel(stop_event):
+    if stop_event is not None and stop_event.is_set():
+        raise Cancelled()
+
+PROGRESS_CHUNK = 1 << 16
+
+def chunked_map(codes, func, out, stop_event=None, progress=None):
+    """按块把func(编码片段)的结果写入out，块间检查取消并更新进度"""
+    if progress is not None:
+        progress.start(len(codes))
+    for start in range(0, len(codes), PROGRESS_CHUNK):
+        check_cancel(stop_event)
+        out[start:start + PROGRESS_CHUNK] = func(codes[start:start + PROGRESS_CHUNK])
+        if progress is not None:
+            progress.update(min(start + PROGRESS_CHUNK, len(codes)))
+    return out
+
+# -------------------- 生成引擎 --------------------
+GEN_CHUNK = 1 << 18
+
+def product_codes(options):
+    """各位置可选码值的笛卡尔积，返回升序编码数组"""
+    codes = np.zeros(1, dtype=np.uint32)
+    for digits in options:
+        codes = (codes[:, None] * 3 + np.array(sorted(digits), dtype=np.uint32)).ravel()
+    return codes
+
+def _selected_digits(selected):
+    return [sorted(int(_CHAR_TO_DIGIT[ord(c)]) for c in chars) for chars in selected]
+
+def _subtract_source(chunk, source_codes):
+    """chunk为一段升序编码，只与数据源落在同一区间的部分做差集"""
+    lo = np.searchsorted(source_codes, chunk[0], side='left')
+    hi = np.searchsorted(source_codes, chunk[-1], side='right')
+    return chunk[np.isin(chunk, source_codes[lo:hi], assume_unique=True, invert=True)]
+
+def generate_new_combinations(source, selected, stop_event=None, progress=None):
+    """生成所选字符的笛卡尔积并扣除数据源
+
+    乘积空间只构建一次：按前缀切块，每块为一段升序编码，
+    与数据源对应区间做批量差集。每块结束后更新progress（ProgressState），
+    stop_event置位后提前结束并返回已生成部分。
+    """
+    if not len(source):
+        return ComboStore()
+    options = _selected_digits(selected)
+    source_codes = np.sort(source.codes)
+
+    split = 0
+    while split < POSITIONS and np.prod([len(o) for o in options[split:]]) > GEN_CHUNK:
+        split += 1
+    prefixes = product_codes(options[:split])
+    suffixes = product_codes(options[split:])
+    block = np.uint32(3 ** (POSITIONS - split))
+    if progress is not None:
+        progress.start(len(prefixes) * len(suffixes))
+
+    parts = []
+    found = 0
+    for done, prefix in enumerate(prefixes, 1):
+        if stop_event is not None and stop_event.is_set():
+            break
+        chunk = _subtract_source(prefix * block + suffixes, source_codes)
+        parts.append(chunk)
+        found += len(chunk)
+        if progress is not None:
+            progress.update(done * len(suffixes), found)
+
+    return ComboStore(np.concatenate(parts) if parts else ())
+
+# -------------------- 特征引擎 --------------------
+# 特征顺序：胜/平/负场数，连胜/连平/连负，胜平/胜负/平负连号
+FEATURE_COUNT = 9
+FEATURE_CHUNK = 1 << 20
+
+def _max_run(flags):
+    """flags为(14,N)布尔矩阵，返回每列最长连续True长度"""
+    best = np.zeros(flags.shape[1], dtype=np.uint8)
+    current = np.zeros(flags.shape[1], dtype=np.uint8)
+    for pos in range(POSITIONS):
+        current += 1
+        current *= flags[pos]
+        np.maximum(best, current, out=best)
+    return best
+
+def compute_features(digits):
+    """对(N,14)码位矩阵批量计算9个常规特征，返回(N,9) uint8"""
+    columns = np.ascontiguousarray(digits.T)
+    is_digit = [columns == digit for digit in range(3)]
+    features = np.empty((FEATURE_COUNT, len(digits)), dtype=np.uint8)
+    # 码值2/1/0即3/1/0
+    for idx, digit in enumerate((2, 1, 0)):
+        features[idx] = is_digit[digit].sum(axis=0, dtype=np.uint8)
+        features[3 + idx] = _max_run(is_digit[digit])
+    # 两种结果混合连号 = 不含第三种结果的最长区间
+    for idx, excluded in enumerate((0, 1, 2)):
+        features[6 + idx] = _max_run(~is_digit[excluded])
+    return features.T
+
+def combo_features(codes):
+    """按块解码并计算特征，避免整表码位矩阵的内存峰值"""
+    features = np.empty((len(codes), FEATURE_COUNT), dtype=np.uint8)
+    for start in range(0, len(codes), FEATURE_CHUNK):
+        stop = start + FEATURE_CHUNK
+        features[start:stop] = compute_features(codes_to_digits(codes[start:stop]))
+    return features
+
+# 全空间特征表：文件头 + UNIVERSE行×9列uint8，按编码直接寻址
+FEATURE_TABLE_VERSION = 1
+FEATURE_TABLE_MAGIC = b'C3FEAT'
+FEATURE_TABLE_HEADER = struct.Struct('<6sHHI32s')
+FEATURE_TABLE_OFFSET = 64
+FEATURE_TABLE_PATH = os.path.join(
+    os.path.expanduser('~'), '.combo_filter', f'features-v{FEATURE_TABLE_VERSION}.bin')
+
+class FeatureTable:
+    """预计算特征表：首次使用时构建或校验并mmap，之后按编码聚取特征行"""
+    def __init__(self, path=FEATURE_TABLE_PATH):
+        self.path = path
+        self._rows = None
+        self._lock = threading.Lock()
+
+    def rows(self):
+        """返回(UNIVERSE,9)只读映射；表文件无法写入时改用内存中的计算结果"""
+        with self._lock:
+            if self._rows is None:
+                try:
+                    self._rows = self._open()
+                except (OSError, ValueError):
+                    features = combo_features(np.arange(UNIVERSE, dtype=np.uint32))
+                    try:
+                        self.build(features)
+                        self._rows = self._open()
+                    except OSError:
+                        # 记住这次结果，之后不再反复重建
+                        features.flags.writeable = False
+                        self._rows = features
+            return self._rows
+
+    def lookup(self, codes):
+        return self.rows()[codes]
+
+    def build(self, features=None):
+        if features is None:
+            features = combo_features(np.arange(UNIVERSE, dtype=np.uint32))
+        header = FEATURE_TABLE_HEADER.pack(
+            FEATURE_TABLE_MAGIC, FEATURE_TABLE_VERSION, FEATURE_COUNT, UNIVERSE,
+            hashlib.sha256(features).digest())
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(header.ljust(FEATURE_TABLE_OFFSET, b'\0'))
+            file.write(features.tobytes())
+        os.replace(tmp_path, self.path)
+
+    def _open(self):
+        with open(self.path, 'rb') as file:
+            header = file.read(FEATURE_TABLE_HEADER.size)
+        if len(header) != FEATURE_TABLE_HEADER.size:
+            raise ValueError("特征表文件头不完整")
+        magic, version, count, total, digest = FEATURE_TABLE_HEADER.unpack(header)
+        if (magic, version, count, total) != (
+                FEATURE_TABLE_MAGIC, FEATURE_TABLE_VERSION, FEATURE_COUNT, UNIVERSE):
+            raise ValueError("特征表版本不匹配")
+        rows = np.memmap(self.path, dtype=np.uint8, mode='r',
+                         offset=FEATURE_TABLE_OFFSET, shape=(UNIVERSE, FEATURE_COUNT))
+        if hashlib.sha256(rows).digest() != digest:
+            raise ValueError("特征表校验失败")
+        return rows
+
+FEATURE_TABLE = FeatureTable()
+
+_POPCOUNT = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+class FeatureIndex:
+    """特征计数索引：各特征取值直方图 + 按条件缓存的位压缩掩码，用于实时预估剩余条数"""
+    MAX_CACHED_MASKS = 64
+
+    def __init__(self, features):
+        self.size = len(features)
+        self.columns = np.ascontiguousarray(features.T)
+        self.histograms = [np.bincount(column, minlength=POSITIONS + 1) for column in self.columns]
+        self._masks = {}
+        # 界面线程预估与后台过滤共用掩码缓存
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        """特征列加上掩码缓存上限的内存占用"""
+        return self.columns.nbytes + self.MAX_CACHED_MASKS * ((self.size + 7) // 8)
+
+    def condition_count(self, feature, min_v, max_v):
+        return int(self.histograms[feature][min_v:max_v + 1].sum())
+
+    def packed_mask(self, feature, min_v, max_v):
+        key = (feature, min_v, max_v)
+        with self._lock:
+            packed = self._masks.pop(key, None)
+            if packed is None:
+                column = self.columns[feature]
+                packed = np.packbits((column >= min_v) & (column <= max_v))
+                if len(self._masks) >= self.MAX_CACHED_MASKS:
+                    del self._masks[next(iter(self._masks))]
+            self._masks[key] = packed
+        return packed
+
+    def _combined(self, conditions):
+        packed = self.packed_mask(*conditions[0]).copy()
+        for cond in conditions[1:]:
+            packed &= self.packed_mask(*cond)
+        return packed
+
+    def mask(self, conditions):
+        if not conditions:
+            return np.ones(self.size, dtype=bool)
+        return np.unpackbits(self._combined(conditions), count=self.size).view(bool)
+
+    def count(self, conditions):
+        """单条件直接查直方图，多条件对缓存掩码做按位与"""
+        if not conditions:
+            return self.size
+        counts = [self.condition_count(*cond) for cond in conditions]
+        if len(conditions) == 1 or min(counts) == 0:
+            return min(counts)
+        return int(_POPCOUNT[self._combined(conditions)].sum(dtype=np.int64))
+
+# -------------------- 定位匹配 --------------------
+ANY_DIGIT = 0b111
+MATCH_CHUNK = 1 << 16
+# 字面条件按固定位置分组后，不足该条数的组改走半码位图：一次isin约抵10个位图字
+MIN_LITERAL_GROUP = 512
+# 每块查表得到的条件位图(行数×k+1×words)字节数上限，条件多或容错大时相应减少每块行数
+MATCH_GATHER_BYTES = 32 << 20
+# 单码值位掩码 -> 码值
+_MASK_TO_DIGIT = np.array([255, 0, 1, 255, 2, 255, 255, 255], dtype=np.uint8)
+
+# 条件文本中位置集合的书写顺序，与界面复选框一致
+CONDITION_CHARS = '310'
+
+def symbol_mask(chars):
+    """3/1/0字符集合 -> 允许码值位掩码"""
+    mask = 0
+    for ch in chars:
+        mask |= 1 << int(_CHAR_TO_DIGIT[ord(ch)])
+    return mask
+
+def parse_condition(text):
+    """条件文本 -> 14位允许码值位掩码
+
+    每位可写单个字符3/1/0、'#'（任意），或位置集合如[31]；
+    只含单字符与'#'时即原有的字面格式。
+    """
+    masks = []
+    pos = 0
+    while pos < len(text):
+        c = text[pos]
+        if c == '[':
+            end = text.find(']', pos)
+            if end < 0:
+                raise ValueError(f"条件格式错误：{text}")
+            group, pos = text[pos + 1:end], end + 1
+        else:
+            group, pos = c, pos + 1
+        if group == '#':
+            masks.append(ANY_DIGIT)
+            continue
+        if not group or any(ch not in CONDITION_CHARS for ch in group):
+            raise ValueError(f"条件格式错误：{text}")
+        masks.append(symbol_mask(group))
+    if len(masks) != POSITIONS:
+        raise ValueError(f"条件格式错误：{text}")
+    return tuple(masks)
+
+def format_condition(masks):
+    """位掩码 -> 条件文本：全选写'#'，单选写字符，其余写[..]"""
+    tokens = []
+    for mask in masks:
+        chars = ''.join(ch for ch in CONDITION_CHARS if mask & symbol_mask(ch))
+        if mask == ANY_DIGIT:
+            tokens.append('#')
+        elif len(chars) == 1:
+            tokens.append(chars)
+        else:
+            tokens.append(f"[{chars}]")
+    return ''.join(tokens)
+
+def compile_conditions(conditions):
+    """定位条件（文本或位掩码序列）-> (C,14)允许码值位掩码矩阵（已去重），格式不符的条件忽略"""
+    rows = []
+    for cond in conditions:
+        if isinstance(cond, str):
+            try:
+                cond = parse_condition(cond)
+            except ValueError:
+                continue
+        rows.append(cond)
+    if not rows:
+        return np.empty((0, POSITIONS), dtype=np.uint8)
+    return np.unique(np.array(rows, dtype=np.uint8), axis=0)
+
+class PositionMatcher:
+    """编译后的定位条件匹配器
+
+    只含单字符与'#'的条件按固定位置分组，条数够多的组投影成编码后做批量isin；
+    其余条件按位置、码值预先求出"允许该码值的条件集合"位图，再合并成
+    高低7位半码两张表，每行只需两次查表按位与即可得到仍然成立的条件。
+
+    mismatches>0（容错匹配）时全部条件走位图：按半码预先用位切片计数器
+    求出"半内恰好错j位"的条件集合(j=0..k)，低半再累加成"至多错j位"，
+    每行两次查表后按 j_高+j_低≤k 组合，耗时仍与数据量成线性。
+    """
+    def __init__(self, allowed, mismatches=0):
+        self.mismatches = mismatches
+        self.match_all = bool((allowed == ANY_DIGIT).all(axis=1).any())
+        single = ((allowed & (allowed - 1)) == 0) | (allowed == ANY_DIGIT)
+        literal = single.all(axis=1) & (allowed != 0).all(axis=1)
+        if mismatches:
+            literal[:] = False
+
+        self.literal_groups = []
+        groups = defaultdict(list)
+        for idx in np.flatnonzero(literal):
+            fixed = tuple(np.flatnonzero(allowed[idx] != ANY_DIGIT))
+            groups[fixed].append(idx)
+        for fixed, rows in groups.items():
+            if len(rows) < MIN_LITERAL_GROUP:
+                # 小组逐组isin比并入位图慢
+                literal[rows] = False
+                continue
+            rows = allowed[rows]
+            positions = np.array(fixed, dtype=np.intp)
+            digits = _MASK_TO_DIGIT[np.array(rows)[:, positions]]
+            self.literal_groups.append((positions, self._project(digits)))
+
+        self.set_table = None
+        self.chunk = MATCH_CHUNK
+        rest = allowed[~literal & (allowed != 0).all(axis=1)]
+        if len(rest):
+            words = (len(rest) + 63) // 64
+            table = np.zeros((POSITIONS, 3, words * 8), dtype=np.uint8)
+            for digit in range(3):
+                bits = ((rest.T >> digit) & 1).astype(bool)
+                table[:, digit, :(len(rest) + 7) // 8] = np.packbits(bits, axis=1, bitorder='little')
+            table = table.view(np.uint64)
+            self.chunk = max(1, min(MATCH_CHUNK, MATCH_GATHER_BYTES // ((mismatches + 1) * words * 8)))
+            if mismatches:
+                self.set_table = self._mismatch_tables(table, words, mismatches)
+            else:
+                self.set_table = []
+                for half in (range(_HALF), range(_HALF, POSITIONS)):
+                    half_table = np.full((_HALF_BASE, words), ~np.uint64(0))
+                    for col, pos in enumerate(half):
+                        half_table &= table[pos, _HALF_DIGITS[:, col]]
+                    self.set_table.append(half_table)
+
+    @staticmethod
+    def _mismatch_tables(table, words, mismatches):
+        """两张(2187,k+1,words)表：高半为恰好错j位的条件集合，低半为至多错k-j位（已倒序便于对位相与）"""
+        tables = []
+        for half in (range(_HALF), range(_HALF, POSITIONS)):
+            # counts[j]：半内恰好错j位的条件，超过k位的直接丢弃（饱和）
+            counts = np.zeros((mismatches + 1, _HALF_BASE, words), dtype=np.uint64)
+            counts[0] = ~np.uint64(0)
+            for col, pos in enumerate(half):
+                miss = ~table[pos, _HALF_DIGITS[:, col]]
+                for j in range(mismatches, 0, -1):
+                    counts[j] = (counts[j] & ~miss) | (counts[j - 1] & miss)
+                counts[0] &= ~miss
+            tables.append(counts)
+        high, low = tables
+        low = np.bitwise_or.accumulate(low, axis=0)[::-1]
+        return [np.ascontiguousarray(high.transpose(1, 0, 2)), np.ascontiguousarray(low.transpose(1, 0, 2))]
+
+    @staticmethod
+    def _project(digits):
+        keys = np.zeros(len(digits), dtype=np.uint32)
+        for col in range(digits.shape[1]):
+            keys *= 3
+            keys += digits[:, col]
+        return keys
+
+    def match(self, codes):
+        """返回与codes等长的布尔数组：命中任一条件为True"""
+        if self.match_all:
+            return np.ones(len(codes), dtype=bool)
+        result = np.zeros(len(codes), dtype=bool)
+        for start in range(0, len(codes), self.chunk):
+            chunk = codes[start:start + self.chunk]
+            hit = result[start:start + self.chunk]
+            if self.literal_groups:
+                digits = codes_to_digits(chunk)
+                for positions, keys in self.literal_groups:
+                    hit |= np.isin(self._project(digits[:, positions]), keys)
+            if self.set_table is not None:
+                rows = np.flatnonzero(~hit)
+                high = chunk[rows] // _HALF_BASE
+                low = chunk[rows] - high * _HALF_BASE
+                acc = self.set_table[0][high]
+                acc &= self.set_table[1][low]
+                hit[rows] = acc.any(axis=tuple(range(1, acc.ndim)))
+        return result
+
+# -------------------- 玄学评分 --------------------
+TRIGRAMS = 27
+
+def trigram_codes(digits):
+    """(N,14)码位矩阵 -> (N,12)连续三场的base-27编码"""
+    return digits[:, :-2] * 9 + digits[:, 1:-1] * 3 + digits[:, 2:]
+
+def score_combos(codes, pattern_scores, position_scores):
+    """按三连模式得分表(27,)与位置得分表(14,3)批量求分
+
+    先把两张表折算到高低7位半码上（各含半内5个三连与7个位置），
+    跨半的两个三连只取决于高半末两位与低半首两位，查81项小表即可。
+    """
+    half_scores = []
+    for offset in (0, _HALF):
+        score = pattern_scores[trigram_codes(_HALF_DIGITS)].sum(axis=1, dtype=np.int64)
+        score += position_scores[np.arange(offset, offset + _HALF), _HALF_DIGITS].sum(axis=1, dtype=np.int64)
+        half_scores.append(score)
+    pair = np.arange(81)
+    a, b, c, d = pair // 27, pair // 9 % 3, pair // 3 % 3, pair % 3
+    cross_scores = pattern_scores[a * 9 + b * 3 + c] + pattern_scores[b * 9 + c * 3 + d]
+
+    high = codes // _HALF_BASE
+    low = codes - high * _HALF_BASE
+    scores = half_scores[0][high] + half_scores[1][low]
+    scores += cross_scores[high % 9 * 9 + low // 3 ** (_HALF - 2)]
+    return scores
+
+# 半码内各位是否为3/1、各三连出现次数，以及跨半两个三连的计数表
+_HALF_HITS = (_HALF_DIGITS != 0).astype(np.int64)
+_HALF_TRIGRAMS = np.zeros((_HALF_BASE, TRIGRAMS), dtype=np.int64)
+np.add.at(_HALF_TRIGRAMS, (np.arange(_HALF_BASE)[:, None], trigram_codes(_HALF_DIGITS)), 1)
+_CROSS_TRIGRAMS = np.zeros((81, TRIGRAMS), dtype=np.int64)
+_pair = np.arange(81)
+np.add.at(_CROSS_TRIGRAMS, (_pair, _pair // 3), 1)
+np.add.at(_CROSS_TRIGRAMS, (_pair, _pair % 27), 1)
+
+STATS_CACHE_SIZE = 32
+_STATS_CACHE = {}
+
+def combo_statistics(store):
+    """位置频率(14,)与三连模式计数(27,)，按内容摘要缓存
+
+    高低半码与跨半两位各做一次bincount，再与半码计数表相乘即得总数。
+    """
+    key = store.digest()
+    stats = _STATS_CACHE.pop(key, None)
+    if stats is None:
+        high = store.codes // _HALF_BASE
+        low = store.codes - high * _HALF_BASE
+        high_hist = np.bincount(high, minlength=_HALF_BASE)
+        low_hist = np.bincount(low, minlength=_HALF_BASE)
+        cross_hist = np.bincount(high % 9 * 9 + low // 3 ** (_HALF - 2), minlength=81)
+        stats = {
+            'position': np.concatenate([high_hist @ _HALF_HITS, low_hist @ _HALF_HITS]),
+            'patterns': (high_hist + low_hist) @ _HALF_TRIGRAMS + cross_hist @ _CROSS_TRIGRAMS,
+        }
+        if len(_STATS_CACHE) >= STATS_CACHE_SIZE:
+            del _STATS_CACHE[next(iter(_STATS_CACHE))]
+    _STATS_CACHE[key] = stats
+    return stats
+
+def top_k_indices(scores, k):
+    """取分数最高的k个下标：部分选择O(N)，同分保持原顺序，结果按分数降序"""
+    n = len(scores)
+    if k >= n:
+        return np.argsort(-scores, kind='stable')
+    kth = np.partition(scores, n - k)[n - k]
+    above = np.flatnonzero(scores > kth)
+    ties = np.flatnonzero(scores == kth)[:k - len(above)]
+    picked = np.concatenate([above, ties])
+    return picked[np.lexsort((picked, -scores[picked]))]
+
+# -------------------- 赔率排序 --------------------
+DEFAULT_ODDS_TOP_N = 50000
+# 小数赔率的返还倒数和（Σ1/赔率）的合理区间；百分比概率等误写会落在区间外
+ODDS_OVERROUND_RANGE = (0.95, 1.5)
+# 赔率文件每行按3/1/0书写，对应的码值列
+_ODDS_COLUMNS = _CHAR_TO_DIGIT[np.frombuffer(CONDITION_CHARS.encode(), dtype=np.uint8)].astype(np.intp)
+
+def normalize_odds(rows):
+    """14行[3,1,0]赔率或概率 -> (14,3)按码值排列的概率表
+
+    一行全部大于1视为小数赔率，取倒数作隐含概率，Σ1/赔率须在
+    ODDS_OVERROUND_RANGE之内；否则视为概率。每行再归一化，去掉庄家抽水。
+    """
+    values = np.array(rows, dtype=np.float64)
+    if values.shape != (POSITIONS, 3):
+        raise ValueError("赔率须为14行，每行3/1/0三个数")
+    if not np.isfinite(values).all() or (values <= 0).any():
+        raise ValueError("赔率与概率必须为正数")
+    decimal = (values > 1).all(axis=1)
+    if ((values > 1).any(axis=1) & ~decimal).any():
+        raise ValueError("同一行不能混用赔率与概率")
+    values[decimal] = 1 / values[decimal]
+    overround = values[decimal].sum(axis=1)
+    low, high = ODDS_OVERROUND_RANGE
+    bad = np.flatnonzero((overround < low) | (overround > high))
+    if len(bad):
+        row = int(np.flatnonzero(decimal)[bad[0]]) + 1
+        raise ValueError(f"第{row}行不像小数赔率（Σ1/赔率={overround[bad[0]]:.2f}），概率请写成0到1之间的小数")
+    # 已归一化的行保持原值，保证规范化后的配置再次规范化结果不变
+    sums = values.sum(axis=1, keepdims=True)
+    values = np.where(np.abs(sums - 1) < 1e-9, values, values / sums)
+    probs = np.empty_like(values)
+    probs[:, _ODDS_COLUMNS] = values
+    return probs
+
+def load_odds(file_path):
+    """读取赔率文件：14行，每行3/1/0三个数（空格、逗号或制表符分隔），#开头为注释"""
+    rows = []
+    with open(file_path, 'r', encoding='utf-8-sig') as file:
+        for line in file:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                try:
+                    rows.append([float(value) for value in line.replace(',', ' ').split()])
+                except ValueError:
+                    raise ValueError(f"赔率格式错误：{line}")
+    if any(len(row) != 3 for row in rows):
+        raise ValueError("赔率须为14行，每行3/1/0三个数")
+    return normalize_odds(rows)
+
+def odds_scores(codes, probs):
+    """按(14,3)概率表批量求对数概率之和：两个半码各查一次预先累加好的表"""
+    log_probs = np.log(probs)
+    high_table = log_probs[np.arange(_HALF), _HALF_DIGITS].sum(axis=1)
+    low_table = log_probs[np.arange(_HALF, POSITIONS), _HALF_DIGITS].sum(axis=1)
+    high = codes // _HALF_BASE
+    return high_table[high] + low_table[codes - high * _HALF_BASE]
+
+def odds_filter(store, probs, top_n=DEFAULT_ODDS_TOP_N, stop_event=None, progress=None):
+    """按赔率隐含概率保留最可能的top_n注
+
+    返回的ComboStore按概率降序；保存结果、会话快照与阶段历史只保留集合，为编码顺序。
+    """
+    scores = np.empty(len(store), dtype=np.float64)
+    chunked_map(store.codes, lambda codes: odds_scores(codes, probs), scores, stop_event, progress)
+    return store.select(top_k_indices(scores, top_n))
+
+# -------------------- 中奖评估 --------------------
+# 开奖结果中'#'或'*'表示该场取消，任何选择都算命中
+VOID_CHARS = '#*'
+DEFAULT_MIN_HITS = 12
+
+def parse_result(text):
+    """开奖结果 -> (14,)码位数组，取消场次为-1"""
+    text = text.strip()
+    if len(text) != POSITIONS or any(c not in CONDITION_CHARS + VOID_CHARS for c in text):
+        raise ValueError(f"开奖结果格式错误：{text}")
+    return np.array([-1 if c in VOID_CHARS else _CHAR_TO_DIGIT[ord(c)] for c in text], dtype=np.int8)
+
+def hit_counts(codes, result):
+    """每注与开奖结果相同的场次数：高低7位半码各查一次命中数表后相加"""
+    tables = []
+    for half in (slice(0, _HALF), slice(_HALF, POSITIONS)):
+        digits = result[half]
+        tables.append(((_HALF_DIGITS == digits) | (digits < 0)).sum(axis=1).astype(np.uint8))
+    high = codes // _HALF_BASE
+    hits = tables[0][high]
+    hits += tables[1][codes - high * _HALF_BASE]
+    return hits
+
+def evaluate_hits(store, results, min_hits=DEFAULT_MIN_HITS, stop_event=None, progress=None):
+    """逐个开奖结果统计命中数直方图(15,)，并取出命中数不低于min_hits的行（按命中数降序）
+
+    返回[{'result', 'histogram', 'winners', 'hits'}]，winners为ComboStore，hits为对应命中数。
+    """
+    reports = []
+    if progress is not None:
+        progress.start(len(results))
+    for done, text in enumerate(results, 1):
+        check_cancel(stop_event)
+        hits = hit_counts(store.codes, parse_result(text))
+        rows = np.flatnonzero(hits >= min_hits)
+        rows = rows[np.argsort(-hits[rows].astype(np.int8), kind='stable')]
+        reports.append({'result': text.strip(), 'histogram': np.bincount(hits, minlength=POSITIONS + 1),
+                        'winners': store.select(rows), 'hits': hits[rows]})
+        if progress is not None:
+            progress.update(done, sum(len(report['winners']) for report in reports))
+    return reports
+
+def winners_store(reports):
+    """各开奖结果中奖组合的并集"""
+    return ComboStore.from_codes(np.concatenate(
+        [np.empty(0, dtype=np.uint32)] + [report['winners'].codes for report in reports]))
+
+def format_hit_report(report, min_hits=DEFAULT_MIN_HITS):
+    """单个开奖结果的统计文本，如 '3103...: 14中1 13中5 12中40'"""
+    histogram = report['histogram']
+    counts = " ".join(f"{hits}中{int(histogram[hits])}" for hits in range(POSITIONS, min_hits - 1, -1))
+    return f"{report['result']}：{counts}"
+
+# -------------------- 缩水覆盖 --------------------
+MAX_COVER_RADIUS = 3
+COVER_TIME_BUDGET = 120.0
+# 批量求邻域时每块的(行数×邻域大小)上限
+COVER_CHUNK_CELLS = 1 << 21
+# 全部邻域不超过该字节数时预先展开，否则每次弹堆时现算
+COVER_BALL_BUDGET = 256 << 20
+_BALL_PATTERNS = {}
+
+def _ball_pattern(radius):
+    """(B,radius)改动表：每行列出要改的(位置,改法)列号，不足radius的用末列(增量0)补齐"""
+    pattern = _BALL_PATTERNS.get(radius)
+    if pattern is None:
+        pad = POSITIONS * 2
+        rows = []
+        for size in range(radius + 1):
+            for positions in itertools.combinations(range(POSITIONS), size):
+                for shifts in itertools.product((0, 1), repeat=size):
+                    row = [pos * 2 + shift for pos, shift in zip(positions, shifts)]
+                    rows.append(row + [pad] * (radius - size))
+        pattern = _BALL_PATTERNS[radius] = np.array(rows, dtype=np.intp).reshape(len(rows), radius)
+    return pattern
+
+def hamming_ball(codes, radius):
+    """编码 -> (N,B)汉明距离不超过radius的全部编码（首列为自身），B=Σ C(14,i)·2^i"""
+    digits = codes_to_digits(codes).astype(np.int64)
+    # deltas[:, 2p+s]：第p位改为(原码+s+1)%3时编码的增量，末列恒为0
+    deltas = np.zeros((len(digits), POSITIONS * 2 + 1), dtype=np.int64)
+    for shift in range(2):
+        deltas[:, shift:POSITIONS * 2:2] = ((digits + shift + 1) % 3 - digits) * _POWERS
+    ball = deltas[:, _ball_pattern(radius)].sum(axis=2)
+    ball += np.asarray(codes, dtype=np.int64)[:, None]
+    return ball.astype(np.uint32)
+
+def cover_reduce(store, radius=1, time_budget=COVER_TIME_BUDGET, stop_event=None, progress=None):
+    """缩水：从store中选出尽量少的注，使每注都落在某个入选注的汉明半径radius之内
+
+    全空间字节位图记录未覆盖的行，惰性贪心：堆里按过期的增益排序，弹出时
+    重新计算，仍不小于堆顶才入选。内存允许时各行邻域预先展开成矩阵。
+    time_budget自调用起计时，含邻域展开与初始增益；超出后剩余未覆盖的行
+    按顺序逐个入选，仍保证全部覆盖。返回(入选注ComboStore, 统计字典)。
+    """
+    deadline = time.perf_counter() + time_budget
+    codes = store.codes
+    total = len(codes)
+    uncovered = np.zeros(UNIVERSE, dtype=bool)
+    uncovered[codes] = True
+    pattern_size = len(_ball_pattern(radius))
+    chunk = max(1, COVER_CHUNK_CELLS // pattern_size)
+    balls = None
+    if total * pattern_size * 4 <= COVER_BALL_BUDGET:
+        balls = np.empty((total, pattern_size), dtype=np.uint32)
+    gains = np.empty(total, dtype=np.int64)
+    for start in range(0, total, chunk):
+        check_cancel(stop_event)
+        ball = hamming_ball(codes[start:start + chunk], radius)
+        if balls is not None:
+            balls[start:start + chunk] = ball
+        gains[start:start + chunk] = np.count_nonzero(uncovered[ball], axis=1)
+
+    def ball_of(idx):
+        return balls[idx] if balls is not None else hamming_ball(codes[idx:idx + 1], radius)[0]
+    heap = list(zip((-gains).tolist(), range(total)))
+    heapq.heapify(heap)
+    if progress is not None:
+        progress.start(total)
+
+    chosen = []
+    covered = 0
+    # 准备阶段已用完预算时直接顺序补齐
+    timed_out = time.perf_counter() > deadline
+    while heap and covered < total and not timed_out:
+        _, idx = heapq.heappop(heap)
+        ball = ball_of(idx)
+        gain = int(np.count_nonzero(uncovered[ball]))
+        if not gain:
+            continue
+        if heap and gain < -heap[0][0]:
+            heapq.heappush(heap, (-gain, idx))
+            continue
+        uncovered[ball] = False
+        covered += gain
+        chosen.append(idx)
+        if len(chosen) % 256 == 0:
+            check_cancel(stop_event)
+            if progress is not None:
+                progress.update(covered, len(chosen))
+            if time.perf_counter() > deadline:
+                timed_out = True
+                break
+    if covered < total:
+        # 超出时间预算：剩余行逐个入选
+        for step, idx in enumerate(np.flatnonzero(uncovered[codes]).tolist()):
+            if step % 1024 == 0:
+                check_cancel(stop_event)
+            if uncovered[codes[idx]]:
+                ball = ball_of(idx)
+                covered += int(np.count_nonzero(uncovered[ball]))
+                uncovered[ball] = False
+                chosen.append(idx)
+    if progress is not None:
+        progress.update(total, len(chosen))
+    info = {'total': total, 'covered': covered, 'tickets': len(chosen), 'radius': radius, 'timed_out': timed_out}
+    return store.select(np.sort(np.array(chosen, dtype=np.intp))), info
+
+def format_cover_report(info):
+    """缩水统计文本，如 '缩水：5000注 -> 812注，覆盖5000/5000（100.0%），保证13中'"""
+    rate = info['covered'] / info['total'] if info['total'] else 1.0
+    text = (f"缩水：{info['total']}注 -> {info['tickets']}注，覆盖{info['covered']}/{info['total']}（{rate:.1%}），"
+            f"保证{POSITIONS - info['radius']}中")
+    if info['timed_out']:
+        text += "（超出时间预算，其余按顺序补齐）"
+    return text
+
+# -------------------- 基础函数 --------------------
+LOAD_CHUNK = 1 << 22
+MAX_BAD_LINES = 20
+_GZIP_MAGIC = b'\x1f\x8b'
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+_BOM = b'\xef\xbb\xbf'
+
+def open_source(file_path):
+    """按扩展名或文件头打开数据源，返回(解压后的二进制流, 底层文件)"""
+    raw = open(file_path, 'rb')
+    magic = raw.read(4)
+    raw.seek(0)
+    if file_path.endswith('.gz') or magic.startswith(_GZIP_MAGIC):
+        import gzip
+        return gzip.GzipFile(fileobj=raw), raw
+    if file_path.endswith('.zst') or magic == _ZSTD_MAGIC:
+        try:
+            import zstandard
+        except ImportError:
+            raw.close()
+            raise ValueError("读取.zst文件需要安装zstandard")
+        return zstandard.ZstdDecompressor().stream_reader(raw), raw
+    return raw, raw
+
+def _encode_columns(column, count):
+    """column(位置) -> 该位置的字节列；逐位累加编码，返回(编码, 非法行掩码)"""
+    codes = np.zeros(count, dtype=np.uint32)
+    invalid = np.zeros(count, dtype=bool)
+    for pos in range(POSITIONS):
+        digits = _CHAR_TO_DIGIT[column(pos)]
+        invalid |= digits == 255
+        codes *= 3
+        codes += digits
+    return codes, invalid
+
+def _scan_lines(buf):
+    """解析以换行结尾的整块数据，返回(有效编码, [(块内行号, 原文)], 行数)"""
+    data = np.frombuffer(buf, dtype=np.uint8)
+    # 快速路径：每行恰好14位（LF或CRLF），可直接按定长重排
+    for stride in (POSITIONS + 1, POSITIONS + 2):
+        if len(data) % stride == 0:
+            rows = data.reshape(-1, stride)
+            if (rows[:, -1] == 10).all() and (stride == POSITIONS + 1 or (rows[:, -2] == 13).all()):
+                codes, invalid = _encode_columns(lambda pos: rows[:, pos], len(rows))
+                if not invalid.any():
+                    return codes, [], len(rows)
+                break
+    ends = np.flatnonzero(data == 10)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts
+    lengths -= (lengths > 0) & (data[ends - 1] == 13)
+    regular = np.flatnonzero(lengths == POSITIONS)
+    offsets = starts[regular]
+    codes, invalid = _encode_columns(lambda pos: data[offsets + pos], len(regular))
+    bad = [(int(regular[i]), buf[offsets[i]:offsets[i] + POSITIONS].decode('utf-8', 'replace'))
+           for i in np.flatnonzero(invalid)]
+    chunks = [codes[~invalid]]
+    # 长度不为14的行按原逻辑去空白后再判断，空行直接跳过
+    extra = []
+    for i in np.flatnonzero(lengths != POSITIONS):
+        text = buf[starts[i]:ends[i]].decode('utf-8', 'replace').strip()
+        if not text:
+            continue
+        if len(text) == POSITIONS and all(c in DIGIT_CHARS for c in text):
+            extra.append(text)
+        else:
+            bad.append((int(i), text))
+    if extra:
+        chunks.append(encode_combos(extra))
+    bad.sort()
+    return np.concatenate(chunks), bad, len(ends)
+
+def load_combinations(file_path, stop_event=None, progress=None):
+    """流式加载数据源（支持.gz/.zst），返回(组合存储, 前若干条错误行[(行号, 原文)], 错误行总数)
+
+    按块读取并直接编码进全空间位图，额外内存与文件大小无关。
+    """
+    present = np.zeros(UNIVERSE, dtype=bool)
+    bad_lines = []
+    bad_count = 0
+    line_no = 1
+    stream, raw = open_source(file_path)
+    with raw, stream:
+        if progress is not None:
+            progress.start(os.fstat(raw.fileno()).st_size)
+        pending = stream.read(LOAD_CHUNK)
+        if pending.startswith(BINARY_MAGIC):
+            return _load_binary(stream, pending, stop_event, progress, raw)
+        if pending.startswith(_BOM):
+            pending = pending[len(_BOM):]
+        while pending:
+            check_cancel(stop_event)
+            chunk = stream.read(LOAD_CHUNK)
+            if chunk:
+                cut = pending.rfind(b'\n') + 1
+                buf, pending = pending[:cut], pending[cut:] + chunk
+            else:
+                buf, pending = pending if pending.endswith(b'\n') else pending + b'\n', b''
+            if not buf:
+                continue
+            codes, bad, lines = _scan_lines(buf)
+            present[codes] = True
+            bad_count += len(bad)
+            bad_lines += [(line_no + i, text) for i, text in bad[:MAX_BAD_LINES - len(bad_lines)]]
+            line_no += lines
+            if progress is not None:
+                progress.update(raw.tell(), int(np.count_nonzero(present)))
+    return ComboStore(np.flatnonzero(present).astype(np.uint32)), bad_lines, bad_count
+
+def _load_binary(stream, pending, stop_event, progress, raw):
+    """读取save_results写出的紧凑二进制格式"""
+    while len(pending) < BINARY_HEADER.size:
+        chunk = stream.read(LOAD_CHUNK)
+        if not chunk:
+            raise ValueError("二进制文件头不完整")
+        pending += chunk
+    magic, version, count = BINARY_HEADER.unpack_from(pending)
+    if version != BINARY_VERSION:
+        raise ValueError("二进制文件版本不匹配")
+    present = np.zeros(UNIVERSE, dtype=bool)
+    pending = pending[BINARY_HEADER.size:]
+    loaded = 0
+    while True:
+        check_cancel(stop_event)
+        usable = len(pending) - len(pending) % 4
+        codes = np.frombuffer(pending[:usable], dtype='<u4')
+        if (codes >= UNIVERSE).any():
+            raise ValueError("二进制文件包含越界编码")
+        present[codes] = True
+        loaded += len(codes)
+        if progress is not None:
+            progress.update(raw.tell(), loaded)
+        chunk = stream.read(LOAD_CHUNK)
+        if not chunk:
+            break
+        pending = pending[usable:] + chunk
+    if loaded != count or usable != len(pending):
+        raise ValueError("二进制文件长度与文件头不符")
+    return ComboStore(np.flatnonzero(present).astype(np.uint32)), [], 0
+
+def format_bad_lines(bad_lines, bad_count):
+    text = "\n".join(f"第{line_no}行：{line}" for line_no, line in bad_lines)
+    if bad_count > len(bad_lines):
+        text += f"\n……共{bad_count}行"
+    return text
+
+def load_original_combinations(file_path):
+    """加载原始组合数据，存在格式错误的行时报错并给出行号"""
+    store, bad_lines, bad_count = load_combinations(file_path)
+    if bad_count:
+        raise ValueError(f"组合格式错误：\n{format_bad_lines(bad_lines, bad_count)}")
+    return store
+
+WRITE_CHUNK = 1 << 18
+# 紧凑二进制格式：文件头后紧跟按升序排列的小端uint32编码
+BINARY_MAGIC = b'C3CODE'
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct('<6sHQ')
+
+def _split_ext(file_path):
+    """拆出扩展名，压缩后缀连同前一个扩展名一起保留，如.txt.gz"""
+    root, ext = os.path.splitext(file_path)
+    if ext in ('.gz', '.zst'):
+        root, inner = os.path.splitext(root)
+        ext = inner + ext
+    return root, ext
+
+def open_output(file_path):
+    """按扩展名打开输出，.gz/.zst写压缩流"""
+    if file_path.endswith('.gz'):
+        import gzip
+        return gzip.open(file_path, 'wb', compresslevel=1)
+    if file_path.endswith('.zst'):
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("写入.zst文件需要安装zstandard")
+        return zstandard.ZstdCompressor().stream_writer(open(file_path, 'wb'), closefd=True)
+    return open(file_path, 'wb')
+
+def _write_codes(file, codes, binary):
+    if binary:
+        file.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(codes)))
+    for start in range(0, len(codes), WRITE_CHUNK):
+        block = codes[start:start + WRITE_CHUNK]
+        if binary:
+            file.write(block.astype('<u4').tobytes())
+            continue
+        # 整块解码为(N,15)字节矩阵，末列为换行，一次写出
+        rows = np.empty((len(block), POSITIONS + 1), dtype=np.uint8)
+        rows[:, :POSITIONS] = _DIGIT_TO_CHAR[codes_to_digits(block)]
+        rows[:, POSITIONS] = ord('\n')
+        file.write(rows.tobytes())
+
+def save_results(file_path, results, part_size=0):
+    """按编码升序保存结果，返回写出的文件列表
+
+    扩展名为.bin时写紧凑二进制格式，.gz/.zst写压缩文件；
+    part_size大于0且结果超过该条数时拆成name.part001.txt等分片文件。
+    """
+    codes = results.codes
+    if len(codes) > 1 and not (codes[:-1] <= codes[1:]).all():
+        codes = np.sort(codes)
+    root, ext = _split_ext(file_path)
+    binary = ext.startswith('.bin')
+    if part_size <= 0 or len(codes) <= part_size:
+        parts = [(file_path, codes)]
+    else:
+        parts = [(f"{root}.part{number:03d}{ext}", codes[start:start + part_size])
+                 for number, start in enumerate(range(0, len(codes), part_size), 1)]
+    for path, part in parts:
+        with open_output(path) as file:
+            _write_codes(file, part, binary)
+    return [path for path, _ in parts]
+
+# -------------------- 会话快照 --------------------
+# 布局：文件头 | JSON元数据 | 按64字节对齐的各阶段升序uint32编码数组
+SNAPSHOT_MAGIC = b'C3SNAP'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct('<6sHQ')
+SNAPSHOT_ALIGN = 64
+
+def _align(offset):
+    return -(-offset // SNAPSHOT_ALIGN) * SNAPSHOT_ALIGN
+
+def _check_extents(entries, data_start, size):
+    """各阶段数组须完整落在文件内；空阶段不占数据区，不做检查"""
+    for entry in entries:
+        count = entry['count']
+        if count and data_start + entry['offset'] + count * 4 > size:
+            raise ValueError("快照文件不完整")
+
+def save_snapshot(file_path, stages, meta=None):
+    """stages为[(阶段参数字典, ComboStore)]，连同各自参数按顺序写入快照"""
+    arrays = []
+    entries = []
+    offset = 0
+    for params, store in stages:
+        codes = store.codes
+        if len(codes) > 1 and not (codes[:-1] <= codes[1:]).all():
+            store = store.sorted()
+        arrays.append((offset, store.codes))
+        entries.append({'params': params, 'offset': offset, 'count': len(store),
+                        'digest': store.digest()})
+        offset = _align(offset + store.codes.nbytes)
+    metadata = json.dumps({'stages': entries, 'meta': meta or {}}, ensure_ascii=False).encode('utf-8')
+    data_start = _align(SNAPSHOT_HEADER.size + len(metadata))
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as file:
+        file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(metadata)))
+        file.write(metadata)
+        for start, codes in arrays:
+            file.seek(data_start + start)
+            file.write(codes.astype('<u4').tobytes())
+        # 末尾的空阶段或对齐空隙不会被写到，补齐到数据区末尾
+        file.truncate(data_start + offset)
+        # 写完按读取时的规则复核一遍，不合格的快照不覆盖原文件
+        _check_extents(entries, data_start, os.fstat(file.fileno()).st_size)
+    os.replace(tmp_path, file_path)
+
+def load_snapshot(file_path):
+    """mmap打开快照，返回([(阶段参数字典, ComboStore)], 附加信息)；不解析文本也不重跑过滤"""
+    with open(file_path, 'rb') as file:
+        header = file.read(SNAPSHOT_HEADER.size)
+        if len(header) != SNAPSHOT_HEADER.size:
+            raise ValueError("快照文件头不完整")
+        magic, version, meta_len = SNAPSHOT_HEADER.unpack(header)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError("不是会话快照文件")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError("快照版本不匹配")
+        metadata = json.loads(file.read(meta_len).decode('utf-8'))
+        size = os.fstat(file.fileno()).st_size
+    data_start = _align(SNAPSHOT_HEADER.size + meta_len)
+    stages = []
+    _check_extents(metadata['stages'], data_start, size)
+    for entry in metadata['stages']:
+        count = entry['count']
+        if count:
+            codes = np.memmap(file_path, dtype='<u4', mode='r',
+                              offset=data_start + entry['offset'], shape=(count,))
+        else:
+            codes = np.empty(0, dtype=np.uint32)
+        store = ComboStore(codes)
+        store._digest = entry['digest']
+        stages.append((entry['params'], store))
+    return stages, metadata['meta']
+
+# -------------------- 过滤规划 --------------------
+# 各条件每行的相对代价（以从特征表聚取一列特征为1）
+PLAN_SAMPLE = 4096
+FEATURE_COST = 1.0
+DECODE_COST = 2.7
+LITERAL_GROUP_COST = 0.3
+SET_TABLE_COST = 0.7
+TOLERANCE_COST = 6.0
+
+def feature_column(codes, feature):
+    """单个特征列：只从特征表聚取这一列"""
+    return FEATURE_TABLE.rows()[codes, feature]
+
+class FilterSample:
+    """规划用的等距抽样，特征直方图按需计算"""
+    def __init__(self, codes, size=PLAN_SAMPLE):
+        if len(codes) > size:
+            codes = codes[np.linspace(0, len(codes) - 1, size).astype(np.intp)]
+        self.codes = codes
+        self._histograms = {}
+
+    def histogram(self, feature):
+        if feature not in self._histograms:
+            self._histograms[feature] = np.bincount(feature_column(self.codes, feature),
+                                                    minlength=POSITIONS + 1)
+        return self._histograms[feature]
+
+class Predicate:
+    """可单独求值的过滤条件：cost为每行相对代价，evaluate返回保留掩码"""
+    cost = 1.0
+
+    def selectivity(self, sample):
+        if not len(sample.codes):
+            return 1.0
+        return float(np.count_nonzero(self.evaluate(sample.codes))) / len(sample.codes)
+
+    def evaluate(self, codes):
+        raise NotImplementedError
+
+class FeaturePredicate(Predicate):
+    """常规条件：特征值落在[min_v, max_v]，只计算用到的那一列"""
+    cost = FEATURE_COST
+
+    def __init__(self, feature, min_v, max_v):
+        self.feature, self.min_v, self.max_v = feature, min_v, max_v
+
+    def selectivity(self, sample):
+        histogram = sample.histogram(self.feature)
+        return float(histogram[self.min_v:self.max_v + 1].sum()) / max(1, len(sample.codes))
+
+    def evaluate(self, codes):
+        column = feature_column(codes, self.feature)
+        return (column >= self.min_v) & (column <= self.max_v)
+
+class PositionPredicate(Predicate):
+    """定位条件：keep为True保留命中任一条件的行，否则保留未命中的行；mismatches为容错位数"""
+    def __init__(self, conditions, keep=True, mismatches=0):
+        self.matcher = PositionMatcher(compile_conditions(conditions), mismatches)
+        self.keep = keep
+        matcher = self.matcher
+        self.cost = 0.0
+        if not matcher.match_all:
+            if matcher.literal_groups:
+                self.cost += DECODE_COST + LITERAL_GROUP_COST * len(matcher.literal_groups)
+            if matcher.set_table is not None:
+                self.cost += SET_TABLE_COST * matcher.set_table[0][0].size
+
+    def evaluate(self, codes):
+        match = self.matcher.match(codes)
+        return match if self.keep else ~match
+
+class TolerancePredicate(Predicate):
+    """玄学容错：出现'0'的位置权重之和不超过容错值"""
+    cost = TOLERANCE_COST
+
+    def __init__(self, max_tolerance, weights):
+        self.max_tolerance, self.weights = max_tolerance, weights
+
+    def evaluate(self, codes):
+        return mystic_mask(codes, [], self.max_tolerance, self.weights)
+
+def anchor_predicate(anchors):
+    """玄学锚定：锚定位置必须为3/1"""
+    masks = [ANY_DIGIT] * POSITIONS
+    for pos in anchors:
+        masks[pos] = symbol_mask('31')
+    return PositionPredicate([tuple(masks)])
+
+def plan_predicates(predicates, sample):
+    """按 代价/(1-选择率) 升序排列：便宜且淘汰多的条件先求值，几乎不淘汰的放最后"""
+    ranked = []
+    for idx, predicate in enumerate(predicates):
+        selectivity = predicate.selectivity(sample)
+        rank = predicate.cost / (1.0 - selectivity) if selectivity < 1.0 else float('inf')
+        ranked.append((rank, predicate.cost, idx))
+    return [predicates[idx] for _, _, idx in sorted(ranked)]
+
+def filter_chain(store, predicates, stop_event=None, progress=None):
+    """按规划顺序逐块求值：后续条件只对仍存活的行计算，块内全部淘汰即跳过其余条件"""
+    if not predicates:
+        return store
+    order = plan_predicates(predicates, FilterSample(store.codes))
+    codes = store.codes
+    keep = np.zeros(len(codes), dtype=bool)
+    if progress is not None:
+        progress.start(len(codes))
+    for start in range(0, len(codes), PROGRESS_CHUNK):
+        check_cancel(stop_event)
+        chunk = codes[start:start + PROGRESS_CHUNK]
+        rows = np.arange(len(chunk))
+        for predicate in order:
+            rows = rows[predicate.evaluate(chunk[rows])]
+            if not len(rows):
+                break
+        keep[start + rows] = True
+        if progress is not None:
+            progress.update(start + len(chunk))
+    return store.select(keep)
+
+# -------------------- 阶段缓存 --------------------
+STAGE_CACHE_BUDGET = 256 << 20
+
+class StageCache:
+    """按字节数限额的LRU缓存：键为(输入摘要, 规范化参数)，值为阶段结果等带nbytes的对象"""
+    def __init__(self, budget=STAGE_CACHE_BUDGET):
+        self.budget = budget
+        self._entries = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        nbytes = value.nbytes
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if nbytes > self.budget:
+                return
+            self._entries[key] = (value, nbytes)
+            self._bytes += nbytes
+            self._trim()
+
+    def run(self, key, compute, stop_event=None):
+        """命中则直接返回，否则计算并缓存；stop_event已置位说明结果可能不完整，不缓存"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            if stop_event is None or not stop_event.is_set():
+                self.put(key, value)
+        return value
+
+    def set_budget(self, budget):
+        with self._lock:
+            self.budget = budget
+            self._trim()
+
+    def _trim(self):
+        while self._bytes > self.budget:
+            _, nbytes = self._entries.pop(next(iter(self._entries)))
+            self._bytes -= nbytes
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self._entries), 'bytes': self._bytes, 'budget': self.budget}
+
+STAGE_CACHE = StageCache()
+
+# -------------------- 阶段历史 --------------------
+class HistoryNode:
+    __slots__ = ('parent', 'params', 'count', 'mask', 'full', 'child')
+
+    def __init__(self, parent, params, count, mask=None, full=None):
+        self.parent = parent
+        self.params = params
+        self.count = count
+        # 筛选阶段只存相对父结果的位压缩掩码；生成等非子集结果存完整存储
+        self.mask = mask
+        self.full = full
+        # 重做时前往的分支（最近一次创建或访问的子节点）
+        self.child = None
+
+class StageHistory:
+    """阶段历史树：撤销/重做只移动游标，在任一节点重新过滤即形成新分支"""
+    MAX_MATERIALIZED = 8
+
+    def __init__(self):
+        self.nodes = []
+        self.cursor = -1
+        self._stores = {}
+
+    def reset(self, params, store):
+        self.nodes = [HistoryNode(None, params, len(store), full=store)]
+        self.cursor = 0
+        self._stores = {}
+
+    def push(self, params, store, parent=None, masked=True):
+        """在parent（默认游标）下追加阶段结果并移动游标，返回新节点序号"""
+        parent = self.cursor if parent is None else parent
+        node = HistoryNode(parent, params, len(store), full=store)
+        if masked:
+            base = self.store(parent)
+            mask = np.isin(base.codes, store.codes, assume_unique=True)
+            if np.count_nonzero(mask) == len(store):
+                # 掩码按父结果的顺序解释，缓存的物化结果也须保持这一顺序
+                node.mask, node.full = np.packbits(mask), None
+                store = base.select(mask)
+        self.nodes.append(node)
+        self.cursor = len(self.nodes) - 1
+        self.nodes[parent].child = self.cursor
+        self._remember(self.cursor, store)
+        return self.cursor
+
+    def store(self, node_id=None):
+        """物化节点结果：自最近的已物化祖先起逐级套用掩码"""
+        node_id = self.cursor if node_id is None else node_id
+        chain = []
+        while node_id not in self._stores and self.nodes[node_id].full is None:
+            chain.append(node_id)
+            node_id = self.nodes[node_id].parent
+        store = self._stores[node_id] if node_id in self._stores else self.nodes[node_id].full
+        for node_id in reversed(chain):
+            mask = np.unpackbits(self.nodes[node_id].mask, count=len(store)).view(bool)
+            store = store.select(mask)
+            self._remember(node_id, store)
+        return store
+
+    def _remember(self, node_id, store):
+        self._stores.pop(node_id, None)
+        if len(self._stores) >= self.MAX_MATERIALIZED:
+            del self._stores[next(iter(self._stores))]
+        self._stores[node_id] = store
+
+    @property
+    def can_undo(self):
+        return self.cursor >= 0 and self.nodes[self.cursor].parent is not None
+
+    @property
+    def can_redo(self):
+        return self.cursor >= 0 and self.nodes[self.cursor].child is not None
+
+    def goto(self, node_id):
+        self.cursor = node_id
+        parent = self.nodes[node_id].parent
+        if parent is not None:
+            self.nodes[parent].child = node_id
+
+    def undo(self):
+        if self.can_undo:
+            self.cursor = self.nodes[self.cursor].parent
+        return self.cursor
+
+    def redo(self):
+        if self.can_redo:
+            self.cursor = self.nodes[self.cursor].child
+        return self.cursor
+
+    def path(self, node_id=None):
+        """根节点到node_id（默认游标）的节点序号"""
+        node_id = self.cursor if node_id is None else node_id
+        path = []
+        while node_id is not None:
+            path.append(node_id)
+            node_id = self.nodes[node_id].parent
+        return path[::-1]
+
+    def stages(self, node_id=None):
+        """沿路径物化为[(阶段参数, ComboStore)]，用于保存会话快照"""
+        return [(self.nodes[idx].params, self.store(idx)) for idx in self.path(node_id)]
+
+    @property
+    def nbytes(self):
+        return sum(node.mask.nbytes if node.mask is not None else node.full.nbytes for node in self.nodes)
+
+# -------------------- 流程阶段 --------------------
+FEATURE_NAMES = ("胜场数", "平场数", "负场数", "连胜", "连平", "连负", "胜平连号", "胜负连号", "平负连号")
+# 各位置出现'0'时计入容错的权重（后卫位置影响更大）
+POSITION_WEIGHTS = (0.8, 0.9, 1.0, 1.1, 0.7, 0.8, 0.9, 1.0, 0.6, 0.7, 0.5, 0.6, 0.4, 0.5)
+
+def lookup_features(store, stop_event=None, progress=None):
+    """按块从特征表取出全部特征行，可取消"""
+    features = np.empty((len(store), FEATURE_COUNT), dtype=np.uint8)
+    return chunked_map(store.codes, FEATURE_TABLE.lookup, features, stop_event, progress)
+
+def basic_filter(store, conditions, stop_event=None, progress=None):
+    """常规过滤：conditions为[(特征序号, 最小值, 最大值)]，按规划顺序只计算用到的特征"""
+    predicates = [FeaturePredicate(*cond) for cond in conditions]
+    return filter_chain(store, predicates, stop_event, progress)
+
+def position_filter(store, conditions, keep=True, stop_event=None, progress=None, mismatches=0):
+    """定位过滤：keep为True保留匹配项，否则过滤掉匹配项；mismatches>0时至多错该位数即算匹配"""
+    return filter_chain(store, [PositionPredicate(conditions, keep, mismatches)], stop_event, progress)
+
+def anchor_positions(stats, num):
+    """按位置频率降序取前num个位置，同频按位置先后，从未出现3/1的位置不参与"""
+    position = stats['position']
+    return [int(idx) for idx in np.argsort(-position, kind='stable') if position[idx]][:num]
+
+def mystic_mask(codes, anchors, max_tolerance, weights=POSITION_WEIGHTS):
+    """锚定位置必须为3/1，且出现'0'的位置权重之和不超过容错值"""
+    mask = np.empty(len(codes), dtype=bool)
+    for start in range(0, len(codes), MATCH_CHUNK):
+        digits = codes_to_digits(codes[start:start + MATCH_CHUNK])
+        is_zero = digits == _CHAR_TO_DIGIT[ord('0')]
+        # 按位置顺序逐位累加，与逐注求和的浮点结果一致
+        cost = np.zeros(len(digits))
+        for pos in range(POSITIONS):
+            cost += np.where(is_zero[:, pos], weights[pos], 0.0)
+        mask[start:start + MATCH_CHUNK] = ~is_zero[:, anchors].any(axis=1) & (cost <= max_tolerance)
+    return mask
+
+def shrink_scores(store, stats):
+    """智能收缩得分：三连模式频率 + 该位为3/1时的位置频率"""
+    position_scores = np.zeros((POSITIONS, 3), dtype=np.int64)
+    for c in ['3', '1']:
+        position_scores[:, _CHAR_TO_DIGIT[ord(c)]] = stats['position']
+    return score_combos(store.codes, stats['patterns'], position_scores)
+
+def mystic_filter(store, anchor_count, max_tolerance, strength, stats=None,
+                  stop_event=None, progress=None):
+    """玄学过滤：智能锚定 -> 动态容错 -> 按得分保留前strength%"""
+    if stats is None:
+        stats = combo_statistics(store)
+    anchors = anchor_positions(stats, anchor_count)
+    # 收缩需要全部存活行的得分，故玄学阶段是屏障：锚定与容错只在阶段内部规划
+    predicates = [anchor_predicate(anchors), TolerancePredicate(max_tolerance, POSITION_WEIGHTS)]
+    filtered = filter_chain(store, predicates, stop_event, progress)
+    check_cancel(stop_event)
+    if filtered:
+        keep_count = max(1, int(len(filtered) * strength / 100))
+        filtered = filtered.select(top_k_indices(shrink_scores(filtered, stats), keep_count))
+    return filtered
+
+def _feature_id(feature):
+    if isinstance(feature, int) and 0 <= feature < FEATURE_COUNT:
+        return feature
+    if feature in FEATURE_NAMES:
+        return FEATURE_NAMES.index(feature)
+    raise ValueError(f"未知的常规条件：{feature}")
+
+def normalize_stage(stage, base_dir='.'):
+    """校验并规范化阶段配置：数值统一类型、条件去重排序、条件文件读入，等价配置结果相同"""
+    kind = stage.get('stage')
+    if kind == 'generate':
+        selected = stage.get('selected', [''] * POSITIONS)
+        if len(selected) != POSITIONS or any(c not in CONDITION_CHARS for chars in selected for c in chars):
+            raise ValueError("generate.selected须为14项，每项由3/1/0组成（空表示全选）")
+        selected = [''.join(c for c in CONDITION_CHARS if c in chars) or CONDITION_CHARS for chars in selected]
+        return {'stage': 'generate', 'selected': selected}
+    if kind == 'basic':
+        conditions = set()
+        for cond in stage.get('conditions', []):
+            if not isinstance(cond, (list, tuple)) or len(cond) != 3:
+                raise ValueError(f"basic.conditions每项须为[条件, 最小值, 最大值]：{cond}")
+            feature, min_v, max_v = cond
+            if min_v > max_v:
+                raise ValueError("最小值不能大于最大值")
+            conditions.add((_feature_id(feature), int(min_v), int(max_v)))
+        return {'stage': 'basic', 'conditions': [list(cond) for cond in sorted(conditions)]}
+    if kind == 'position':
+        # 配置中的条件逐条校验，写错的条件报错而不是悄悄丢弃
+        conditions = [parse_condition(cond) if isinstance(cond, str) else tuple(cond)
+                      for cond in stage.get('conditions', [])]
+        if 'conditions_file' in stage:
+            with open(os.path.join(base_dir, stage['conditions_file']), 'r') as file:
+                for lineno, line in enumerate(file, 1):
+                    if line.strip():
+                        try:
+                            conditions.append(parse_condition(line.strip()))
+                        except ValueError as e:
+                            raise ValueError(f"{stage['conditions_file']}第{lineno}行：{e}")
+        mismatches = int(stage.get('mismatches', 0))
+        if not 0 <= mismatches < POSITIONS:
+            raise ValueError(f"position.mismatches须在0到{POSITIONS - 1}之间")
+        return {'stage': 'position',
+                'conditions': [format_condition(masks) for masks in compile_conditions(conditions)],
+                'keep': bool(stage.get('keep', True)), 'mismatches': mismatches}
+    if kind == 'mystic':
+        return {'stage': 'mystic', 'anchor_count': int(stage.get('anchor_count', 5)),
+                'tolerance': float(stage.get('tolerance', 3)), 'strength': float(stage.get('strength', 50))}
+    if kind == 'evaluate':
+        results = [text.strip().replace('*', '#') for text in stage.get('results', [])]
+        for text in results:
+            parse_result(text)
+        return {'stage': 'evaluate', 'results': results,
+                'min_hits': int(stage.get('min_hits', DEFAULT_MIN_HITS))}
+    if kind == 'odds':
+        if 'odds_file' in stage:
+            probs = load_odds(os.path.join(base_dir, stage['odds_file']))
+        else:
+            probs = normalize_odds(stage.get('odds', []))
+        top_n = int(stage.get('top_n', DEFAULT_ODDS_TOP_N))
+        if top_n < 1:
+            raise ValueError("odds.top_n须为正整数")
+        return {'stage': 'odds', 'odds': probs[:, _ODDS_COLUMNS].tolist(), 'top_n': top_n}
+    if kind == 'cover':
+        radius = int(stage.get('radius', 1))
+        if not 1 <= radius <= MAX_COVER_RADIUS:
+            raise ValueError(f"cover.radius须在1到{MAX_COVER_RADIUS}之间")
+        return {'stage': 'cover', 'radius': radius, 'time_budget': float(stage.get('time_budget', COVER_TIME_BUDGET))}
+    raise ValueError(f"未知的阶段类型：{kind}")
+
+def stage_key(store, stage):
+    """阶段缓存键：(输入摘要, 规范化参数)"""
+    return store.digest(), json.dumps(stage, sort_keys=True, ensure_ascii=False)
+
+def _execute_stage(store, stage, stop_event, progress):
+    kind = stage['stage']
+    if kind == 'generate':
+        selected = [list(chars) for chars in stage['selected']]
+        return generate_new_combinations(store, selected, stop_event, progress)
+    if kind == 'basic':
+        return basic_filter(store, [tuple(cond) for cond in stage['conditions']], stop_event, progress)
+    if kind == 'position':
+        return position_filter(store, stage['conditions'], stage['keep'], stop_event, progress, stage['mismatches'])
+    if kind == 'evaluate':
+        # 作为流程阶段时输出任一开奖结果下达到min_hits的组合
+        return winners_store(evaluate_hits(store, stage['results'], stage['min_hits'], stop_event, progress))
+    if kind == 'odds':
+        return odds_filter(store, normalize_odds(stage['odds']), stage['top_n'], stop_event, progress)
+    if kind == 'cover':
+        return cover_reduce(store, stage['radius'], stage['time_budget'], stop_event, progress)[0]
+    return mystic_filter(store, stage['anchor_count'], stage['tolerance'], stage['strength'],
+                         None, stop_event, progress)
+
+def stage_predicates(stage):
+    """规范化后的常规/定位阶段 -> 条件列表，供跨阶段合并规划"""
+    if stage['stage'] == 'basic':
+        return [FeaturePredicate(*cond) for cond in stage['conditions']]
+    return [PositionPredicate(stage['conditions'], stage['keep'], stage['mismatches'])]
+
+def group_stages(stages):
+    """相邻的常规/定位阶段合并为一组统一规划；其余阶段单独成组"""
+    groups = []
+    for stage in stages:
+        mergeable = stage['stage'] in ('basic', 'position')
+        if mergeable and groups and groups[-1][0]['stage'] in ('basic', 'position'):
+            groups[-1].append(stage)
+        else:
+            groups.append([stage])
+    return groups
+
+def run_stage(store, stage, base_dir='.', stop_event=None, progress=None, cache=None):
+    """按配置执行单个阶段，返回新的ComboStore；给出cache时相同输入与参数直接取缓存结果"""
+    stage = normalize_stage(stage, base_dir)
+    if cache is None:
+        return _execute_stage(store, stage, stop_event, progress)
+    return cache.run(stage_key(store, stage), lambda: _execute_stage(store, stage, stop_event, progress),
+                     stop_event)
+
+def load_spec(path):
+    """读取JSON或TOML格式的流程配置"""
+    if path.endswith('.toml'):
+        try:
+            import tomllib
+        except ImportError:
+            raise ValueError("读取TOML配置需要Python 3.11及以上版本")
+        with open(path, 'rb') as file:
+            return tomllib.load(file)
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+def run_pipeline(spec, base_dir='.', source=None, output=None, log=None, snapshot=None, report=None):
+    """依次执行spec['stages']，返回最终结果；log(阶段名, 条数, 用时秒)每阶段回调一次
+
+    给出snapshot时把数据源与各阶段结果连同参数写入会话快照；
+    评估阶段的命中统计与缩水阶段的覆盖统计逐行交给report(文本)。
+    """
+    source = source or spec.get('source')
+    if not source:
+        raise ValueError("未指定数据源")
+    # 先校验全部阶段，配置有误时不必等数据源加载完
+    normalized = [normalize_stage(stage, base_dir) for stage in spec.get('stages', [])]
+    source = os.path.join(base_dir, source)
+    store = load_original_combinations(source)
+    stages = [({'stage': 'source', 'path': os.path.abspath(source)}, store)]
+    if log is not None:
+        log('source', len(store), 0.0)
+    snapshot = snapshot or spec.get('snapshot')
+    # 快照需要每个阶段各自的结果，此时不做跨阶段合并
+    groups = [[stage] for stage in normalized] if snapshot else group_stages(normalized)
+    for group in groups:
+        started = time.perf_counter()
+        if group[0]['stage'] == 'evaluate':
+            reports = evaluate_hits(store, group[0]['results'], group[0]['min_hits'])
+            if report is not None:
+                for item in reports:
+                    report(format_hit_report(item, group[0]['min_hits']))
+            store = winners_store(reports)
+        elif group[0]['stage'] == 'cover':
+            store, info = cover_reduce(store, group[0]['radius'], group[0]['time_budget'])
+            if report is not None:
+                report(format_cover_report(info))
+        elif len(group) == 1:
+            store = run_stage(store, group[0], base_dir)
+        else:
+            store = filter_chain(store, [pred for stage in group for pred in stage_predicates(stage)])
+        stages.append((group[0], store))
+        if log is not None:
+            log('+'.join(stage['stage'] for stage in group), len(store), time.perf_counter() - started)
+    output = output or spec.get('output')
+    if output:
+        save_results(os.path.join(base_dir, output), store)
+    if snapshot:
+        save_snapshot(os.path.join(base_dir, snapshot), stages)
+    return store
+
+# -------------------- 历史回测 --------------------
+def load_draws(file_path):
+    """读取历史开奖文件（保留顺序与重复），返回(编码数组, 跳过的行数)；含取消场次或格式不符的行跳过"""
+    stream, raw = open_source(file_path)
+    with raw, stream:
+        text = stream.read().decode('utf-8-sig', errors='replace')
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    valid = [line for line in lines if len(line) == POSITIONS and all(c in CONDITION_CHARS for c in line)]
+    return encode_combos(valid), len(lines) - len(valid)
+
+def _stage_checks(stage, current):
+    """阶段 -> ([(条件说明, 判定函数)], 整个阶段的判定函数)；判定函数对编码数组返回通过掩码"""
+    kind = stage['stage']
+    if kind == 'basic':
+        checks = [(f"{FEATURE_NAMES[feature]} {min_v}-{max_v}", FeaturePredicate(feature, min_v, max_v).evaluate)
+                  for feature, min_v, max_v in stage['conditions']]
+        return checks, None
+    if kind == 'position':
+        checks = [(cond, PositionPredicate([cond], stage['keep'], stage['mismatches']).evaluate)
+                  for cond in stage['conditions']]
+        return checks, PositionPredicate(stage['conditions'], stage['keep'], stage['mismatches']).evaluate
+    if kind == 'generate':
+        options = tuple(symbol_mask(chars) for chars in stage['selected'])
+        checks = [("勾选选项", PositionPredicate([options]).evaluate)]
+        if current is not None:
+            checks.append(("不在数据源中", lambda codes: ~np.isin(codes, current.codes)))
+        return checks, None
+    if kind == 'mystic':
+        if current is None:
+            raise ValueError("回测玄学阶段需要数据源")
+        # 锚定位置与收缩分数线都取自当前数据上的实际运行
+        stats = combo_statistics(current)
+        anchors = anchor_positions(stats, stage['anchor_count'])
+        kept = mystic_filter(current, stage['anchor_count'], stage['tolerance'], stage['strength'], stats)
+        cutoff = shrink_scores(kept, stats).min() if kept else np.iinfo(np.int64).max
+        checks = [
+            ("锚定位置 " + ",".join(str(pos + 1) for pos in anchors), anchor_predicate(anchors).evaluate),
+            (f"容错≤{stage['tolerance']:g}", TolerancePredicate(stage['tolerance'], POSITION_WEIGHTS).evaluate),
+            (f"收缩得分≥{cutoff}", lambda codes: shrink_scores(ComboStore(codes), stats) >= cutoff),
+        ]
+        return checks, None
+    if kind == 'odds':
+        if current is None:
+            raise ValueError("回测赔率阶段需要数据源")
+        probs = normalize_odds(stage['odds'])
+        kept = odds_filter(current, probs, stage['top_n'])
+        cutoff = odds_scores(kept.codes, probs).min() if kept else np.inf
+        return [(f"对数概率≥{cutoff:.3f}", lambda codes: odds_scores(codes, probs) >= cutoff)], None
+    if kind == 'cover':
+        if current is None:
+            raise ValueError("回测缩水阶段需要数据源")
+        tickets = cover_reduce(current, stage['radius'], stage['time_budget'])[0]
+        chosen = np.zeros(UNIVERSE, dtype=bool)
+        chosen[tickets.codes] = True
+        return [(f"距所选{len(tickets)}注不超过{stage['radius']}位",
+                 lambda codes: chosen[hamming_ball(codes, stage['radius'])].any(axis=1))], None
+    return [], None
+
+def backtest(draws, stages, store=None, base_dir='.', cache=None, stop_event=None, progress=None):
+    """用历史开奖结果逐条检验流程中的各阶段与各条件
+
+    条件直接作用在历史开奖编码上，无需生成全空间；玄学与生成阶段依赖的
+    当前数据由store（数据源）按流程实际运行得到。返回行列表：
+    {'stage', 'condition'(阶段整体为None), 'passed', 'survived'(累计存活，仅阶段行)}。
+    """
+    stages = [normalize_stage(stage, base_dir) for stage in stages]
+    # 只需把当前数据推进到最后一个依赖它的阶段
+    needed = max((idx for idx, stage in enumerate(stages) if stage['stage'] in ('generate', 'mystic', 'odds', 'cover')), default=-1)
+    alive = np.ones(len(draws), dtype=bool)
+    rows = []
+    current = store
+    if progress is not None:
+        progress.start(len(stages))
+    for idx, stage in enumerate(stages):
+        check_cancel(stop_event)
+        checks, combined = _stage_checks(stage, current)
+        if checks:
+            stage_mask = np.ones(len(draws), dtype=bool)
+            condition_rows = []
+            for label, check in checks:
+                mask = check(draws)
+                stage_mask &= mask
+                condition_rows.append({'stage': stage['stage'], 'condition': label,
+                                       'passed': int(np.count_nonzero(mask))})
+            if combined is not None:
+                stage_mask = combined(draws)
+            alive &= stage_mask
+            rows.append({'stage': stage['stage'], 'condition': None,
+                         'passed': int(np.count_nonzero(stage_mask)), 'survived': int(np.count_nonzero(alive))})
+            rows += condition_rows
+        if current is not None and idx < needed:
+            current = run_stage(current, stage, base_dir, stop_event, cache=cache)
+        if progress is not None:
+            progress.update(idx + 1, int(np.count_nonzero(alive)))
+    return rows
+
+def format_backtest(rows, total):
+    """回测报告文本：阶段整体通过率与累计存活率，其下逐条列出各条件单独的通过率"""
+    def rate(count):
+        return f"{count}/{total}（{count / total:.1%}）" if total else "0/0"
+    lines = []
+    for row in rows:
+        if row['condition'] is None:
+            lines.append(f"{row['stage']}：通过 {rate(row['passed'])}，累计存活 {rate(row['survived'])}")
+        else:
+            lines.append(f"    {row['condition']}：{rate(row['passed'])}")
+    return lines
+
+# -------------------- 命令行 --------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按流程配置批量执行组合生成与过滤")
+    parser.add_argument('spec', help="流程配置文件（.json或.toml）")
+    parser.add_argument('-s', '--source', help="数据源文件，覆盖配置中的source")
+    parser.add_argument('-o', '--output', help="结果文件，覆盖配置中的output")
+    parser.add_argument('-S', '--snapshot', help="会话快照文件，覆盖配置中的snapshot")
+    parser.add_argument('-b', '--backtest', help="历史开奖文件：不执行流程，改为回测各阶段与条件的通过率")
+    parser.add_argument('-q', '--quiet', action='store_true', help="不输出各阶段统计")
+    args = parser.parse_args(argv)
+
+    def log(name, count, seconds):
+        if not args.quiet:
+            print(f"{name}: {count}条，用时{seconds:.3f}秒")
+
+    try:
+        spec = load_spec(args.spec)
+        base_dir = os.path.dirname(os.path.abspath(args.spec))
+        # 命令行给出的路径相对当前目录
+        source = os.path.abspath(args.source) if args.source else None
+        output = os.path.abspath(args.output) if args.output else None
+        snapshot = os.path.abspath(args.snapshot) if args.snapshot else None
+        if args.backtest:
+            draws, skipped = load_draws(args.backtest)
+            source = source or (os.path.join(base_dir, spec['source']) if spec.get('source') else None)
+            store = load_original_combinations(source) if source else None
+            if skipped:
+                print(f"跳过{skipped}行无法回测的开奖结果（含取消场次或格式错误）")
+            for line in format_backtest(backtest(draws, spec.get('stages', []), store, base_dir), len(draws)):
+                print(line)
+            return 0
+        run_pipeline(spec, base_dir, source, output, log, snapshot, None if args.quiet else print)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"错误：{e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())